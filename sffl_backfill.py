@@ -0,0 +1,174 @@
+"""Season backfill: render every post the bots would have made over a week range, without posting.
+
+    python sffl_backfill.py --weeks 1-18                 # archive to backfill/<league_id>/
+    python sffl_backfill.py --weeks 3-5 --out /tmp/arch --refresh
+
+Transactions for all weeks are fetched concurrently into the local TxnStore (weeks already
+stored and final are loaded as they are). Each week's realtime lines are rendered in a
+worker process; daily digests are grouped by New York day, and every week's Rumor Central
+note (as of its last transaction) comes from one season-wide RumorTable. The archive is
+deterministic for a given store and player index (sorted keys, no run timestamps), so two
+runs can be diffed; throughput goes to stdout and the run metrics instead.
+"""
+import os, sys, json, time, argparse
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+from zoneinfo import ZoneInfo
+from sffl_common import (
+    TXN_STORE_PATH, PLAYER_INDEX_PATH, PlayerIndex, TxnStore, get_current_week, get_league_users,
+    get_rosters, get_player_index, league_meta_check, load_leagues, pack_lines, render_txns, split_line,
+    team_names, txn_store, run_leagues, report_leagues, LeagueConfig, METRICS, profile_run, _write_atomic
+)
+import sffl_bsky_daily as daily
+import sffl_bsky_weekly_rumors as rumors
+
+BACKFILL_DIR = os.getenv("SFFL_BACKFILL_DIR", "backfill")
+BACKFILL_WORKERS = int(os.getenv("SFFL_BACKFILL_WORKERS", "0")) or (os.cpu_count() or 1)
+
+
+def parse_weeks(spec: str) -> List[int]:
+    """"1-18" or "3" or "1,4,7-9" -> sorted week numbers."""
+    weeks = set()
+    for part in spec.split(","):
+        lo, _, hi = part.strip().partition("-")
+        weeks.update(range(int(lo), int(hi or lo) + 1))
+    return sorted(weeks)
+
+
+# -------- Archive --------
+def write_lines(path: str, rows: Iterable[dict]) -> str:
+    """Write rows as JSON Lines (sorted keys, so identical input gives identical bytes);
+    returns the file's sha256 for the manifest."""
+    import hashlib
+    body = "".join(json.dumps(row, sort_keys=True, ensure_ascii=False, separators=(",", ":")) + "\n" for row in rows)
+    _write_atomic(path, body)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+# -------- Per-week rendering (runs in worker processes) --------
+_worker: Dict[str, object] = {}
+
+def _open(store_path: str, index_path: str) -> Tuple[TxnStore, PlayerIndex]:
+    # Each worker process opens its own read connections, once.
+    if _worker.get("paths") != (store_path, index_path):
+        _worker.update(paths=(store_path, index_path), store=TxnStore(store_path), players=PlayerIndex(index_path))
+    return _worker["store"], _worker["players"]
+
+def render_week(league_id: str, week: int, teams: Dict[str,str], root: str,
+                store_path: str = TXN_STORE_PATH, index_path: str = PLAYER_INDEX_PATH) -> dict:
+    """Render one week's realtime posts into <root>/week-NN.jsonl. Returns the file's hash and
+    counts, the rendered lines (for the daily digests) and the time of the week's last
+    transaction, which its Rumor Central note is taken at."""
+    store, players = _open(store_path, index_path)
+    txns = store.week(league_id, week)
+    rendered = render_txns(txns, players, teams)
+    realtime = [{"txn_id": tid, "created_ms": created, "posts": split_line(text)} for tid, text, created in rendered]
+    return {
+        "week": week, "txns": len(txns), "posts": sum(len(r["posts"]) for r in realtime),
+        "sha256": write_lines(os.path.join(root, f"week-{week:02d}.jsonl"), realtime),
+        "as_of_ms": max(int(t.get("created", 0) or 0) for t in txns) + 1 if txns else None,
+        "rendered": rendered,
+    }
+
+
+def rumor_table(league_id: str, season: List[dict], players: PlayerIndex) -> rumors.RumorTable:
+    table = rumors.RumorTable()
+    table.extend(league_id, season, players)
+    table.sort()
+    return table
+
+def rumor_note(league_id: str, table: rumors.RumorTable, teams: Dict[str,str], as_of_ms: int) -> List[str]:
+    """The Rumor Central thread (header, then packed lines) as of as_of_ms."""
+    lines = rumors.rumor_lines(league_id, table.windows(as_of_ms, end_ms=as_of_ms), teams)
+    return [lines[0]] + [text for text, _ in pack_lines(lines[1:])]
+
+def daily_digests(rendered: Iterable[Tuple[str, str, int]]) -> List[dict]:
+    """One digest thread (header, then packed lines) per New York day, oldest day first."""
+    tz = ZoneInfo("America/New_York")
+    by_day: Dict[str, List[Tuple[int, str, str]]] = {}
+    for tid, text, created in rendered:
+        day = datetime.fromtimestamp(created / 1000, tz).date().isoformat()
+        by_day.setdefault(day, []).append((created, tid, text))
+    return [{"date": day, "posts": [daily.HEADER] + [text for text, _ in pack_lines([text for _, _, text in sorted(rows)])]}
+            for day, rows in sorted(by_day.items())]
+
+
+def backfill_league(league: LeagueConfig, weeks: List[int], out_dir: str,
+                    workers: int = BACKFILL_WORKERS, refresh: bool = False) -> str:
+    """Fetch/load, render and archive weeks for one league under <out_dir>/<league_id>/:
+    week-NN.jsonl (realtime posts per transaction), daily.jsonl, rumors.jsonl and a
+    manifest.json with counts and file hashes."""
+    league_id = league.league_id
+    root = os.path.join(out_dir, league_id)
+    t0 = time.perf_counter()
+    store = txn_store()
+    with METRICS.stage("transactions"):
+        fetched = store.backfill(league_id, weeks, get_current_week(), refresh)
+        season = store.window(league_id, 0)   # every stored week, for the season-to-date notes
+    with METRICS.stage("metadata"):
+        league_meta_check(league_id, season)
+        owner_by_roster, teamname_by_roster = get_rosters(league_id)
+        teams = team_names(owner_by_roster, teamname_by_roster, get_league_users(league_id))
+    with METRICS.stage("players"):
+        players = get_player_index()
+
+    with METRICS.stage("format"):
+        args = [(league_id, w, teams, root, store.path, players.path) for w in weeks]
+        if workers <= 1 or len(weeks) == 1:
+            results = [render_week(*a) for a in args]
+            table = rumor_table(league_id, season, players)
+        else:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn, not fork: other leagues' threads may hold locks at the moment of the fork.
+            with ProcessPoolExecutor(max_workers=min(workers, len(weeks)), mp_context=multiprocessing.get_context("spawn")) as pool:
+                pending = pool.map(render_week, *zip(*args))
+                table = rumor_table(league_id, season, players)   # meanwhile, in this process
+                results = list(pending)
+        del season
+        notes = [{"week": r["week"], "as_of_ms": r["as_of_ms"], "posts": rumor_note(league_id, table, teams, r["as_of_ms"])}
+                 for r in results if r["as_of_ms"]]
+        digests = daily_digests(row for r in results for row in r.pop("rendered"))
+
+    with METRICS.stage("archive"):
+        files = {f"week-{r['week']:02d}.jsonl": r["sha256"] for r in results}
+        files["daily.jsonl"] = write_lines(os.path.join(root, "daily.jsonl"), digests)
+        files["rumors.jsonl"] = write_lines(os.path.join(root, "rumors.jsonl"), notes)
+        counts = {
+            "txns": sum(r["txns"] for r in results),
+            "realtime_posts": sum(r["posts"] for r in results),
+            "daily_posts": sum(len(d["posts"]) for d in digests),
+            "rumor_posts": sum(len(n["posts"]) for n in notes),
+        }
+        with open(os.path.join(root, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"league_id": league_id, "weeks": weeks, "counts": counts, "files": files}, f, indent=1, sort_keys=True)
+
+    secs = time.perf_counter() - t0
+    n_txns = counts["txns"]
+    return (f"Backfilled weeks {weeks[0]}-{weeks[-1]} ({len(fetched)} fetched): {n_txns} transaction(s) -> "
+            f"{counts['realtime_posts']} realtime, {counts['daily_posts']} daily, {counts['rumor_posts']} rumor post(s) "
+            f"in {secs:.2f}s ({n_txns / secs if secs else 0:.0f} txns/s) -> {root}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SFFL season backfill (renders, never posts)")
+    ap.add_argument("--weeks", default="1-18", help='week range, e.g. "1-18" or "1,4,7-9"')
+    ap.add_argument("--out", default=BACKFILL_DIR, help="archive directory")
+    ap.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="render processes (1 = inline)")
+    ap.add_argument("--refresh", action="store_true", help="refetch weeks already stored")
+    args = ap.parse_args()
+
+    leagues = load_leagues()   # no Bluesky credentials needed: nothing is posted
+    if not leagues:
+        print("Missing env vars: SLEEPER_LEAGUE_ID", file=sys.stderr)
+        sys.exit(1)
+    weeks = parse_weeks(args.weeks)
+    try:
+        report_leagues(leagues, run_leagues(leagues, lambda lg: backfill_league(lg, weeks, args.out, args.workers, args.refresh)))
+    finally:
+        METRICS.emit("backfill")
+
+
+if __name__ == "__main__":
+    with profile_run("backfill"):
+        main()
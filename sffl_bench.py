@@ -0,0 +1,275 @@
+"""Benchmarks for the SFFL hot paths on synthetic Sleeper payloads.
+
+    python sffl_bench.py                          # season + multi-league scenarios
+    python sffl_bench.py --txns 100000 --rosters 32
+    python sffl_bench.py --save-baseline          # record bench_baseline.json
+    python sffl_bench.py --imports                # import-time budget of the guarded jobs only
+
+Each benchmark reports best/median wall time and tracemalloc peak. With a stored
+baseline, anything slower or hungrier than --tolerance is flagged and the exit code is 1.
+The time-guarded jobs must also import within --import-budget-ms without loading
+requests/atproto, so their skip path stays cheap; a breach also exits 1.
+"""
+import os, sys, json, time, random, argparse, tempfile, statistics, subprocess, tracemalloc
+from typing import Dict, List, Callable
+
+from sffl_common import (
+    PlayerIndex, TxnStore, parse_users, parse_rosters, player_rows, player_index_build,
+    parse_players_stream, pack_lines, format_txn_lines, render_txns, team_names, state_encode, state_decode
+)
+import sffl_bsky_weekly_rumors as rumors
+
+BASELINE_PATH = "bench_baseline.json"
+GUARDED_JOBS = ["sffl_bsky_daily", "sffl_bsky_weekly_rumors"]
+HEAVY_MODULES = ["requests", "urllib3", "atproto", "httpx"]
+IMPORT_BUDGET_MS = 30.0
+SCENARIOS = {
+    "season": {"txns": 10_000, "rosters": 12},
+    "multi_league": {"txns": 100_000, "rosters": 32},
+}
+
+# -------- Synthetic Sleeper payloads --------
+POSITIONS = ["QB", "RB", "RB", "WR", "WR", "WR", "TE", "K", "DEF", "LB", "DL", "DB", "OL"]
+NFL_TEAMS = ["ARI", "ATL", "BAL", "BUF", "CAR", "CHI", "CIN", "CLE", "DAL", "DEN", "DET", "GB",
+             "HOU", "IND", "JAX", "KC", "LAC", "LAR", "LV", "MIA", "MIN", "NE", "NO", "NYG",
+             "NYJ", "PHI", "PIT", "SEA", "SF", "TB", "TEN", "WAS"]
+FIRST = ["James", "Josh", "Justin", "Christian", "Tyreek", "Travis", "Davante", "Derrick", "Cooper", "Amon-Ra",
+         "Patrick", "Lamar", "Jalen", "Bijan", "Breece", "Garrett", "Puka", "Nico", "Sam", "De'Von"]
+LAST = ["Allen", "Jackson", "Hurts", "Jefferson", "Hill", "Kelce", "Adams", "Henry", "Kupp", "St. Brown",
+        "Mahomes", "Robinson", "Hall", "Wilson", "Nacua", "Collins", "LaPorta", "Achane", "Smith", "Brown"]
+TXN_TYPES = ["waiver"] * 5 + ["free_agent"] * 4 + ["trade"]
+
+def synth_players(n: int = 10_000, seed: int = 1) -> Dict[str, dict]:
+    """Sleeper-shaped /players/nfl map, including the bulky fields real payloads carry."""
+    rng = random.Random(seed)
+    players: Dict[str, dict] = {}
+    for abbr in NFL_TEAMS:   # team defenses: no full_name, like the real dump
+        players[abbr] = {"player_id": abbr, "position": "DEF", "fantasy_positions": ["DEF"],
+                         "team": abbr, "first_name": abbr, "last_name": "Defense", "active": True}
+    for i in range(n - len(NFL_TEAMS)):
+        pid = str(1000 + i)
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        pos = rng.choice(POSITIONS)
+        players[pid] = {
+            "player_id": pid, "first_name": first, "last_name": last, "full_name": f"{first} {last}",
+            "search_full_name": f"{first}{last}".lower(), "search_first_name": first.lower(),
+            "search_last_name": last.lower(), "position": pos, "fantasy_positions": [pos],
+            "team": rng.choice(NFL_TEAMS), "number": rng.randint(0, 99), "age": rng.randint(21, 38),
+            "years_exp": rng.randint(0, 15), "birth_date": f"{rng.randint(1986, 2003)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+            "height": str(rng.randint(68, 79)), "weight": str(rng.randint(170, 330)),
+            "college": rng.choice(["Alabama", "Ohio State", "LSU", "Georgia", "USC", "Michigan"]),
+            "status": rng.choice(["Active", "Inactive", "Injured Reserve"]),
+            "injury_status": rng.choice([None, None, "Questionable", "Out"]),
+            "injury_body_part": rng.choice([None, "Knee", "Hamstring", "Ankle"]),
+            "injury_notes": rng.choice([None, "Limited in practice Wednesday.", "Did not practice."]),
+            "depth_chart_position": pos, "depth_chart_order": rng.randint(1, 4),
+            "search_rank": rng.randint(1, 9_999_999), "active": rng.random() > 0.2,
+            "sportradar_id": f"{rng.getrandbits(64):016x}", "espn_id": rng.randint(1, 5_000_000),
+            "yahoo_id": rng.randint(1, 50_000), "rotowire_id": rng.randint(1, 20_000),
+            "metadata": {"channel_id": str(rng.getrandbits(60))}, "hashtag": f"#{first}{last}-NFL",
+        }
+    return players
+
+def synth_users_rosters(n_rosters: int, seed: int = 2):
+    """Sleeper-shaped /users and /rosters rows; every third roster has a metadata team name."""
+    rng = random.Random(seed)
+    users, rosters = [], []
+    for r in range(1, n_rosters + 1):
+        uid = str(700_000_000 + r)
+        users.append({"user_id": uid, "display_name": f"gm_{r}", "username": f"gm{r}",
+                      "metadata": {"team_name": f"Team Name {r}"} if rng.random() > 0.5 else {}})
+        rosters.append({"roster_id": r, "owner_id": uid,
+                        "metadata": {"team_name": f"Roster {r}"} if r % 3 == 0 else {}})
+    return users, rosters
+
+def synth_transactions(n: int, n_rosters: int, player_ids: List[str], start_ms: int,
+                       span_ms: int = 18 * 7 * 86400 * 1000, seed: int = 3) -> List[dict]:
+    """Sleeper-shaped transactions spread over span_ms, oldest first, with a realistic type mix."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        ttype = rng.choice(TXN_TYPES)
+        created = start_ms + int(span_ms * i / max(1, n)) + rng.randint(0, 60_000)
+        if ttype == "trade":
+            a, b = rng.sample(range(1, n_rosters + 1), 2)
+            adds = {pid: rng.choice((a, b)) for pid in rng.sample(player_ids, rng.randint(2, 5))}
+            roster_ids, drops = [a, b], {pid: (a if to == b else b) for pid, to in adds.items()}
+        else:
+            r = rng.randint(1, n_rosters)
+            roster_ids = [r]
+            adds = {rng.choice(player_ids): r} if rng.random() > 0.15 else None
+            drops = {rng.choice(player_ids): r} if rng.random() > 0.3 else None
+        out.append({
+            "transaction_id": str(900_000_000_000 + i), "type": ttype,
+            "status": "complete" if rng.random() > 0.05 else "failed",
+            "created": created, "status_updated": created + rng.randint(0, 5000),
+            "roster_ids": roster_ids, "adds": adds, "drops": drops, "leg": 1 + i * 18 // max(1, n),
+            "creator": str(700_000_000 + roster_ids[0]), "consenter_ids": roster_ids,
+            "settings": {"waiver_bid": rng.randint(0, 50)} if ttype == "waiver" else None,
+            "waiver_budget": [], "draft_picks": [], "metadata": None,
+        })
+    return out
+
+# -------- Measurement --------
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"best_ms": round(min(times), 3), "median_ms": round(statistics.median(times), 3),
+            "peak_kib": round(peak / 1024, 1)}
+
+def run_scenario(name: str, n_txns: int, n_rosters: int, repeat: int, workdir: str) -> Dict[str, dict]:
+    players_raw = synth_players()
+    user_rows, roster_rows = synth_users_rosters(n_rosters)
+    users = parse_users(user_rows)
+    owner_by_roster, teamname_by_roster = parse_rosters(roster_rows)
+    start_ms = int(time.time() * 1000) - 18 * 7 * 86400 * 1000
+    txns = synth_transactions(n_txns, n_rosters, [p for p in players_raw if p.isdigit()], start_ms)
+
+    index_path = os.path.join(workdir, f"{name}-players.sqlite")
+    results = {"player_index_build": measure(lambda: player_index_build(player_rows(players_raw), index_path), 1)}
+    players = PlayerIndex(index_path)
+    del players_raw
+
+    teams = team_names(owner_by_roster, teamname_by_roster, users)
+    results["format_txn_lines"] = measure(
+        lambda: format_txn_lines(txns, players, users, owner_by_roster, teamname_by_roster), repeat)
+    results["render_txns_cached_teams"] = measure(lambda: render_txns(txns, players, teams), repeat)
+    lines = [text for _tid, text, _ts in render_txns(txns, players, teams)]
+    results["pack_lines"] = measure(lambda: pack_lines(lines), repeat)
+    now_ms = start_ms + 18 * 7 * 86400 * 1000
+    results["rumors_aggregate"] = measure(lambda: rumors.aggregate({name: txns}, players, now_ms), repeat)
+    stats = rumors.aggregate({name: txns}, players, now_ms)
+    results["rumors_lines"] = measure(lambda: rumors.rumor_lines(name, stats, teams), repeat)
+
+    # All within the retention window, so this measures serialization rather than state_evict.
+    recent_ms = int(time.time() * 1000) - 86400 * 1000
+    posted = {t["transaction_id"]: recent_ms - i for i, t in enumerate(txns)}
+    encoded = state_encode(posted)
+    results["state_encode"] = measure(lambda: state_encode(posted), repeat)
+    results["state_decode"] = measure(lambda: state_decode(encoded), repeat)
+
+    # Daily window: yesterday-sized slice in the middle of the season.
+    day_start = start_ms + 9 * 7 * 86400 * 1000
+    day_end = day_start + 86400 * 1000
+    results["daily_window_scan"] = measure(
+        lambda: [t for t in txns if day_start <= int(t.get("created", 0) or 0) < day_end], repeat)
+    store = TxnStore(os.path.join(workdir, f"{name}-txns.sqlite"))
+    weeks: Dict[int, List[dict]] = {}
+    for t in txns:
+        weeks.setdefault(t["leg"], []).append(t)
+    results["txn_store_ingest"] = measure(lambda: [store.ingest(name, w, ts) for w, ts in weeks.items()], 1)
+    results["daily_window_store"] = measure(lambda: store.window(name, day_start, day_end), repeat)
+    return results
+
+def run_players_parse(repeat: int) -> Dict[str, dict]:
+    """/players/nfl parsing: r.json() on the whole body vs the streaming, projected parser."""
+    payload = json.dumps(synth_players(), separators=(",", ":")).encode("utf-8")
+    chunk = 1 << 16
+    results = {
+        "parse_full": measure(lambda: json.loads(payload.decode("utf-8")), repeat),
+        "parse_stream": measure(
+            lambda: parse_players_stream(payload[i:i + chunk] for i in range(0, len(payload), chunk)), repeat),
+    }
+    full, stream = results["parse_full"], results["parse_stream"]
+    print(f"players: {len(payload) / 1024:.0f} KiB payload; streaming parse takes "
+          f"{stream['best_ms'] / full['best_ms']:.0%} of the time and {stream['peak_kib'] / full['peak_kib']:.0%} "
+          f"of the peak memory of r.json()")
+    return results
+
+def check_imports(budget_ms: float, repeat: int = 3) -> List[str]:
+    """Import each time-guarded job in a fresh interpreter (best of `repeat`, via -X importtime)
+    and flag any that exceed budget_ms or pull in a heavy HTTP/Bluesky module."""
+    flagged = []
+    for mod in GUARDED_JOBS:
+        code = f"import sys, {mod}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+        best, heavy = float("inf"), ""
+        env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}   # time warm .pyc, not compiling
+        for _ in range(repeat + 1):
+            p = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                               check=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+            line = next(l for l in reversed(p.stderr.splitlines()) if l.rstrip().endswith(f"| {mod}"))
+            best, heavy = min(best, int(line.split("|")[1]) / 1000), p.stdout.strip()
+        print(f"{'imports/' + mod:<42} best {best:>10.2f} ms   budget {budget_ms:.0f} ms"
+              + (f"   loads {heavy}" if heavy else ""))
+        if best > budget_ms:
+            flagged.append(f"{mod} imports in {best:.1f} ms (budget {budget_ms:.0f} ms)")
+        if heavy:
+            flagged.append(f"{mod} imports {heavy} before its time guard")
+    return flagged
+
+# -------- Baseline --------
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    flagged = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric in ("best_ms", "peak_kib"):
+            if base.get(metric) and cur[metric] > base[metric] * (1 + tolerance):
+                flagged.append(f"{key} {metric}: {cur[metric]} vs baseline {base[metric]} "
+                               f"(+{(cur[metric] / base[metric] - 1) * 100:.0f}%)")
+    return flagged
+
+def report(key: str, r: Dict[str, float]) -> None:
+    print(f"{key:<42} best {r['best_ms']:>10.2f} ms   median {r['median_ms']:>10.2f} ms   peak {r['peak_kib']:>10.1f} KiB")
+
+def main():
+    ap = argparse.ArgumentParser(description="SFFL hot-path benchmarks")
+    ap.add_argument("--txns", type=int, help="custom scenario: transaction count")
+    ap.add_argument("--rosters", type=int, default=12, help="custom scenario: roster count")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--save-baseline", action="store_true", help="overwrite the baseline with this run")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging (0.25 = 25%%)")
+    ap.add_argument("--json", help="also write results to this file")
+    ap.add_argument("--imports", action="store_true", help="only run the import-time budget check")
+    ap.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    args = ap.parse_args()
+
+    over_budget = check_imports(args.import_budget_ms)
+    for line in over_budget:
+        print(f"IMPORT BUDGET: {line}")
+    if args.imports:
+        sys.exit(1 if over_budget else 0)
+
+    scenarios = {"custom": {"txns": args.txns, "rosters": args.rosters}} if args.txns else SCENARIOS
+    results: Dict[str, dict] = {}
+    with tempfile.TemporaryDirectory(prefix="sffl-bench-") as workdir:
+        for name, sc in scenarios.items():
+            for bench, r in run_scenario(name, sc["txns"], sc["rosters"], args.repeat, workdir).items():
+                key = f"{name}/{bench}"
+                results[key] = r
+                report(key, r)
+        for bench, r in run_players_parse(args.repeat).items():
+            key = f"players/{bench}"
+            results[key] = r
+            report(key, r)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}.")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            flagged = compare(results, json.load(f), args.tolerance)
+        for line in flagged:
+            print(f"REGRESSION: {line}")
+        if flagged:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}.")
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,30 @@
-import os, sys
 from sffl_common import (
-    is_now_ny, get_current_week, get_league_users, get_rosters, get_players,
-    get_transactions, format_txn_lines, bsky_post_many, ny_day_bounds
+    is_now_ny, fetch_league_snapshot, render_txns, bsky_post_thread, ny_day_bounds,
+    LeagueConfig, LeagueSnapshot, leagues_or_exit, run_leagues, report_leagues, METRICS, profile_run
 )
 
+HEADER = "Daily SFFL Transaction Recap (yesterday):"
+WEEKS_BACK = 1   # yesterday may sit in last week's listing
+
+
+def run_league(league: LeagueConfig, snap: LeagueSnapshot | None = None) -> str:
+    """Post yesterday's digest. `snap` may be shared with other jobs (sffl_scheduler) if it
+    was fetched with at least WEEKS_BACK weeks of history."""
+    league_id = league.league_id
+    snap = snap or fetch_league_snapshot(league_id, weeks_back=WEEKS_BACK)
+    start_ms, end_ms = ny_day_bounds(days_back=1)  # yesterday
+    with METRICS.stage("format"):
+        txns = snap.store.window(league_id, start_ms, end_ms)
+        pairs = render_txns(txns, snap.players, snap.teams)  # (id, text, created_ms)
+        yday = [(txt, created) for (_tid, txt, created) in pairs if start_ms <= created < end_ms]
+    if not yday:
+        return "No transactions yesterday."
+
+    with METRICS.stage("post"):
+        n_posts = bsky_post_thread(league.handle, league.app_password, HEADER,
+                                   [txt for txt, _ in yday], created_ms=[created for _, created in yday])
+    return f"Posted daily digest with {len(yday)} item(s) in {n_posts} post(s)."
+
 
 def main():
     # 8am ET guard
@@ -11,30 +32,13 @@ def main():
         print("Skipping: not 8am New York time.")
         return
 
-    league_id = os.getenv("SLEEPER_LEAGUE_ID")
-    handle = os.getenv("BSKY_HANDLE")
-    app_pw  = os.getenv("BSKY_APP_PASSWORD")
-    if not all([league_id, handle, app_pw]):
-        print("Missing env vars", file=sys.stderr)
-        sys.exit(1)
-
-    week = get_current_week()
-    users = get_league_users(league_id)
-    owner_by_roster, teamname_by_roster = get_rosters(league_id)
-    players = get_players()
-    txns = get_transactions(league_id, week)
-    pairs = format_txn_lines(txns, players, users, owner_by_roster, teamname_by_roster)  # (id, text, created_ms)
-
-    start_ms, end_ms = ny_day_bounds(days_back=1)  # yesterday
-    yday = [txt for (_tid, txt, created) in pairs if start_ms <= created < end_ms]
-    if not yday:
-        print("No transactions yesterday.")
-        return
-
-    posts = ["Daily SFFL Transaction Recap (yesterday):"] + yday
-    bsky_post_many(handle, app_pw, posts)
-    print(f"Posted daily digest with {len(yday)} item(s).")
+    try:
+        leagues = leagues_or_exit()
+        report_leagues(leagues, run_leagues(leagues, run_league))
+    finally:
+        METRICS.emit("daily")
 
 
 if __name__ == "__main__":
-    main()
+    with profile_run("daily"):
+        main()
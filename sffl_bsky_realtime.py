@@ -1,54 +1,233 @@
-import os, sys
+import os, sys, json, time, signal, argparse, threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
 from sffl_common import (
-    get_current_week, get_league_users, get_rosters, get_players, get_transactions,
-    format_txn_lines, bsky_post_many, state_load, state_save,
-    players_cache_load, players_cache_save
+    get_current_week, get_league_users, get_rosters, league_meta_check, get_players, get_player_index,
+    get_transactions_if_changed, txn_delta, txn_summary, format_txn_lines, bsky_client, bsky_client_drop,
+    bsky_post_many, bsky_send_chain, bsky_limiter, split_line, outbox, state_load, state_save,
+    state_evict, players_cache_load, players_cache_save, LeagueConfig, leagues_or_exit,
+    run_leagues, report_leagues, METRICS, CACHE_DIR, DRY_RUN, DEBUG, profile_run, _POSTABLE_STATUS, _write_atomic
 )
 
+# Daemon polling cadence (seconds). Fast during waiver runs, the trade deadline
+# and right after activity; slow overnight; normal otherwise.
+POLL_FAST_SECS   = int(os.getenv("SFFL_POLL_FAST_SECS", "30"))
+POLL_NORMAL_SECS = int(os.getenv("SFFL_POLL_NORMAL_SECS", "120"))
+POLL_SLOW_SECS   = int(os.getenv("SFFL_POLL_SLOW_SECS", "600"))
+BURST_HOLD_SECS  = int(os.getenv("SFFL_BURST_HOLD_SECS", "900"))
+WAIVER_DOW = int(os.getenv("SFFL_WAIVER_DOW", "2"))                 # Mon=0..Sun=6 (Sleeper default: Wed)
+WAIVER_HOURS = tuple(int(h) for h in os.getenv("SFFL_WAIVER_HOURS", "2-6").split("-"))  # [start, end) ET
+TRADE_DEADLINE = os.getenv("SFFL_TRADE_DEADLINE", "")               # YYYY-MM-DD, New York date
+OVERNIGHT_HOURS = (1, 7)
 
-def main():
-    league_id = os.getenv("SLEEPER_LEAGUE_ID")
-    handle = os.getenv("BSKY_HANDLE")
-    app_pw  = os.getenv("BSKY_APP_PASSWORD")
-    if not all([league_id, handle, app_pw]):
-        print("Missing env vars", file=sys.stderr)
-        sys.exit(1)
-
-    week = get_current_week()
+
+def players_source():
+    # Runners are ephemeral: seed the local index from the Gist copy before hitting Sleeper.
+    cached = players_cache_load(max_age_hours=24)
+    if cached is not None:
+        return cached
+    fresh = get_players()
+    players_cache_save(fresh)
+    return fresh
+
+
+def poll_interval(now_ny: datetime, last_activity: float = 0.0) -> int:
+    """Seconds until the next daemon poll."""
+    if last_activity and time.time() - last_activity < BURST_HOLD_SECS:
+        return POLL_FAST_SECS
+    if TRADE_DEADLINE and now_ny.date().isoformat() == TRADE_DEADLINE:
+        return POLL_FAST_SECS
+    if now_ny.weekday() == WAIVER_DOW and WAIVER_HOURS[0] <= now_ny.hour < WAIVER_HOURS[1]:
+        return POLL_FAST_SECS
+    if OVERNIGHT_HOURS[0] <= now_ny.hour < OVERNIGHT_HOURS[1]:
+        return POLL_SLOW_SECS
+    return POLL_NORMAL_SECS
+
+
+def sig_path(league_id: str) -> str:
+    return os.path.join(CACHE_DIR, f"realtime.{league_id}.json")
+
+def sig_load(league_id: str) -> dict:
+    """Signature of the last fully handled payload (see get_transactions_if_changed), kept
+    locally so one-shot runs can skip an unchanged week without touching the Gist."""
+    try:
+        with open(sig_path(league_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def sig_save(league_id: str, sig: dict) -> None:
+    if DRY_RUN:
+        return   # a dry run has not really handled anything
+    _write_atomic(sig_path(league_id), json.dumps(sig, separators=(",", ":")))
+
+
+def tick(league: LeagueConfig, cache: dict, week: int | None = None) -> tuple[int, str]:
+    """One poll of one league: queue unseen transactions in the outbox, drain it, and record
+    each post in cache["seen"] (txn_id -> created_ms) as it is acked. `cache` holds what a
+    daemon keeps across ticks (seen set, last payload signature); an
+    unchanged payload returns before any parsing, Gist I/O or metadata fetch, and a changed
+    one is diffed against the last (txn_delta). Returns (number posted, status message)."""
+    league_id, handle, app_pw = league.league_id, league.handle, league.app_password
+    if week is None:
+        week = get_current_week()
+    if "sig" not in cache:
+        cache["sig"] = sig_load(league_id)
+    prev = cache["sig"] if cache["sig"].get("week") == week else {}
     # Pull transactions first
-    txns = get_transactions(league_id, week)
-    if not txns:
-        print("No transactions present.")
-        return
+    with METRICS.stage("transactions"):
+        txns, sig = get_transactions_if_changed(league_id, week, prev)
+    box = outbox(":memory:") if DRY_RUN else outbox()   # dry runs must not ack anything for real
+    METRICS.cache_result("transactions", txns is None)
+    if txns is None:
+        if not box.queued(league_id):
+            return 0, "Transactions unchanged."
+        delta = []
+    else:
+        delta = txn_delta(txns, prev.get("status", {}), prev.get("watermark", 0))
 
-    seen = state_load()
-    candidate_ids = {str(t.get("transaction_id", "")) for t in txns if t.get("status") in (None, "complete", "processed")}
-    if not any((tid and tid not in seen) for tid in candidate_ids):
-        print("No new transactions to post.")
-        return
+    def handled(result: tuple[int, str]) -> tuple[int, str]:
+        # Only a tick that got this far without raising may advance the signature.
+        if txns is not None:
+            cache["sig"] = {**sig, "week": week, **txn_summary(txns)}
+            sig_save(league_id, cache["sig"])
+        return result
 
-    users = get_league_users(league_id)
-    owner_by_roster, teamname_by_roster = get_rosters(league_id)
+    if not delta and not box.queued(league_id):
+        return handled((0, "No transactions present." if not txns else "No changed transactions."))
 
-    players = players_cache_load(max_age_hours=24)
-    if players is None:
-        players = get_players()
-        players_cache_save(players)
+    seen = cache.get("seen")
+    if seen is None:
+        with METRICS.stage("state_load"):
+            seen = cache["seen"] = state_load(league_id)
+            seen.update(box.acked(league_id))   # acks that never reached a state save
+    queued = box.queued(league_id)
+    given_up = box.failed(league_id)   # rejected for good; reported when it happened
+    candidate_ids = {str(t.get("transaction_id", "")) for t in delta if t.get("status") in _POSTABLE_STATUS}
+    fresh = {tid for tid in candidate_ids if tid and tid not in seen and tid not in queued and tid not in given_up}
+    if not fresh and not queued:
+        return handled((0, "No new transactions to post."))
 
-    pairs = format_txn_lines(txns, players, users, owner_by_roster, teamname_by_roster)
-    new = [(tid, txt) for (tid, txt, _ts) in pairs if tid and tid not in seen]
-    if not new:
-        print("No new transactions after formatting.")
-        return
+    if fresh:
+        with METRICS.stage("metadata"):   # cached; refetched on TTL expiry or an unknown roster
+            league_meta_check(league_id, delta)
+            users = get_league_users(league_id)
+            owner_by_roster, teamname_by_roster = get_rosters(league_id)
+        with METRICS.stage("players"):
+            players = get_player_index(players_source)   # shared across leagues, rebuilt only when stale
+        with METRICS.stage("format"):
+            pairs = format_txn_lines([t for t in delta if str(t.get("transaction_id", "")) in fresh],
+                                     players, users, owner_by_roster, teamname_by_roster)
+            box.enqueue(league_id, sorted((p for p in pairs if p[0] in fresh), key=lambda x: x[0]))
+
+    client = None
+    if not DRY_RUN:
+        with METRICS.stage("login"):
+            client = bsky_client(handle, app_pw)   # shared by every job in this process
+    limiter = bsky_limiter(handle)
+
+    def send(text: str, created_ms: int):
+        if DRY_RUN:
+            return bsky_post_many(handle, app_pw, [text])
+        pieces = split_line(text)   # a long trade becomes a short self-reply chain
+        return bsky_send_chain(client, pieces, limiter, [created_ms] * len(pieces))
 
-    to_post = [txt for (_tid, txt) in sorted(new, key=lambda x: x[0])]
-    bsky_post_many(handle, app_pw, to_post)
+    def ack(tid: str, created_ms: int):
+        seen[tid] = created_ms or int(time.time()*1000)
 
-    for tid, _ in new:
-        seen.add(tid)
-    state_save(seen)
-    print(f"Posted {len(to_post)} update(s).")
+    with METRICS.stage("post"):
+        posted, left = box.drain(league_id, send, ack)
+    msg = f"Posted {posted} update(s)." + (f" {left} queued for retry." if left else "")
+    return handled((posted, msg))
+
+
+def step(league: LeagueConfig, cache: dict, week: int | None = None) -> tuple[int, str]:
+    """tick() for a long-running caller (daemon, sffl_scheduler): checkpoints the seen set
+    only when it changed, and drops the shared client after a failure."""
+    try:
+        posted, msg = tick(league, cache, week)
+    except Exception:
+        bsky_client_drop(league.handle)   # force a fresh login in case the session went stale
+        raise
+    if posted and not DRY_RUN:   # a dry run's acks stay in memory, like its outbox
+        cache["seen"] = state_evict(cache["seen"])
+        with METRICS.stage("state_save"):
+            state_save(cache["seen"], league.league_id)
+    return posted, msg
+
+
+def seen_load(league_id: str) -> dict:
+    """Posted ids for a long-running caller: the stored state plus any outbox acks that a
+    crashed run never got into it (written back now, so they survive losing the outbox)."""
+    seen = state_load(league_id)
+    box = outbox(":memory:") if DRY_RUN else outbox()
+    missing = {tid: ms for tid, ms in box.acked(league_id).items() if tid not in seen}
+    if missing:
+        seen = state_evict({**seen, **missing})
+        state_save(seen, league_id)
+    return seen
+
+
+def run_daemon(leagues: list[LeagueConfig]) -> None:
+    stop = threading.Event()
+    def _stop(signum, _frame):
+        print(f"Received signal {signum}; shutting down after this tick.")
+        stop.set()
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    tz = ZoneInfo("America/New_York")
+    caches = {lg.league_id: {"seen": seen_load(lg.league_id)} for lg in leagues}
+    last_activity = 0.0
+    known = sum(len(c["seen"]) for c in caches.values())
+    print(f"Realtime daemon started for {len(leagues)} league(s) with {known} known transaction(s).")
+
+    while not stop.is_set():
+        try:
+            week = get_current_week()
+            results = run_leagues(leagues, lambda lg: step(lg, caches[lg.league_id], week))
+            for lg in leagues:
+                res = results[lg.league_id]
+                if isinstance(res, Exception):
+                    continue
+                posted, msg = res
+                if posted:
+                    last_activity = time.time()
+                if posted or DEBUG:
+                    tag = f"[{lg.league_id}] " if len(leagues) > 1 else ""
+                    print(f"{datetime.now(tz):%Y-%m-%d %H:%M:%S} {tag}{msg}")
+        except Exception as e:
+            print(f"Tick failed: {e}", file=sys.stderr)
+        METRICS.emit("realtime")   # one record per daemon tick
+        METRICS.reset()
+        stop.wait(poll_interval(datetime.now(tz), last_activity))
+    print("Realtime daemon stopped.")
+
+
+def run_once(league: LeagueConfig) -> str:
+    cache: dict = {}
+    posted, msg = tick(league, cache)
+    if posted and not DRY_RUN:
+        with METRICS.stage("state_save"):
+            state_save(cache["seen"], league.league_id)
+    return msg
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SFFL Beat Reporter realtime poster")
+    ap.add_argument("--daemon", action="store_true", help="keep running and poll on an adaptive interval")
+    args = ap.parse_args()
+
+    leagues = leagues_or_exit()
+    if args.daemon:
+        run_daemon(leagues)
+        return
+    try:
+        report_leagues(leagues, run_leagues(leagues, run_once))
+    finally:
+        METRICS.emit("realtime")
 
 
 if __name__ == "__main__":
-    main()
+    with profile_run("realtime"):
+        main()
@@ -1,84 +1,178 @@
-import os, sys
+import os, math, time
+from array import array
+from bisect import bisect_left
 from collections import defaultdict, Counter
+from typing import Dict, Iterable, List, Tuple
 from sffl_common import (
-    is_now_ny, get_current_week, get_league_users, get_rosters, get_players,
-    get_transactions, format_txn_lines, bsky_post_many, ny_day_bounds
+    is_now_ny, fetch_league_snapshot, bsky_post_thread, PlayerIndex,
+    LeagueConfig, LeagueSnapshot, leagues_or_exit, run_leagues, report_leagues, METRICS, profile_run, _POSTABLE_STATUS
 )
 
 
-def infer_position(pid: str, players: dict) -> str:
-    return players.get(pid, {}).get("position") or players.get(pid, {}).get("fantasy_positions", ["?"])[0] or "?"
+# League-relative thresholds: a roster's count must sit RUMOR_Z standard deviations above the
+# league mean for that position and window (and reach RUMOR_MIN_COUNT) to make the note.
+RUMOR_Z = float(os.getenv("SFFL_RUMOR_Z", "2.0"))
+RUMOR_MIN_COUNT = int(os.getenv("SFFL_RUMOR_MIN_COUNT", "2"))
+SEASON_WEEKS = 18      # synced once; later runs only refetch the current week
+DAY_MS = 86400 * 1000
+WINDOWS = (("7d", 7), ("14d", 14), ("season", None))
 
+ADD, DROP, TRADE = 0, 1, 2
+ADD_TYPES = {"waiver", "free_agent", "waivers", "add"}
+DROP_TYPES = {"waiver", "free_agent", "waivers", "drop"}
 
-def main():
-    # Wednesday 8pm ET guard (Mon=0 -> Wed=2)
-    if not is_now_ny(20, dow=2):
-        print("Skipping: not Wed 8pm New York time.")
-        return
 
-    league_id = os.getenv("SLEEPER_LEAGUE_ID")
-    handle = os.getenv("BSKY_HANDLE")
-    app_pw  = os.getenv("BSKY_APP_PASSWORD")
-    if not all([league_id, handle, app_pw]):
-        print("Missing env vars", file=sys.stderr)
-        sys.exit(1)
-
-    week = get_current_week()
-    users = get_league_users(league_id)
-    owner_by_roster, teamname_by_roster = get_rosters(league_id)
-    players = get_players()
-    txns = get_transactions(league_id, week)
-
-    # Past 7 days window (NY time)
-    start_ms, _ = ny_day_bounds(days_back=7)
-    # Build simple heuristics
-    adds_pos = defaultdict(Counter)
-    drops_pos = defaultdict(Counter)
-    trades = Counter()
-
-    for t in txns:
-        created = int(t.get("created", 0) or 0)
-        if created < start_ms:
-            continue
-        status = t.get("status")
-        if status not in (None, "complete", "processed"):
-            continue
-        ttype = t.get("type")
-        roster_ids = [str(r) for r in (t.get("roster_ids") or [])]
-        if not roster_ids:
-            continue
-        rid = roster_ids[0]
-
-        if ttype in {"waiver","free_agent","waivers","add"}:
-            for pid in (t.get("adds") or {}).keys():
-                adds_pos[rid][infer_position(pid, players)] += 1
-        if ttype in {"waiver","free_agent","waivers","drop"}:
-            for pid in (t.get("drops") or {}).keys():
-                drops_pos[rid][infer_position(pid, players)] += 1
-        if ttype == "trade":
-            trades[rid] += 1
-            if len(roster_ids) > 1:
-                trades[roster_ids[1]] += 1
+class RumorTable:
+    """Transactions flattened once into parallel columns, one row per roster move:
+    league, roster, position, kind (ADD/DROP/TRADE) and created. Rows are kept sorted by
+    created, so every trailing window is a suffix and a group-by is one Counter(zip(...))."""
+    def __init__(self):
+        self.league: List[str] = []
+        self.roster: List[str] = []
+        self.pos: List[str] = []
+        self.kind = array("b")
+        self.created = array("q")
+        self._sorted = True
+
+    def __len__(self) -> int:
+        return len(self.created)
+
+    def extend(self, league_id: str, txns: Iterable[dict], players: PlayerIndex) -> None:
+        league, roster, pos, kind, created = (self.league.append, self.roster.append, self.pos.append,
+                                              self.kind.append, self.created.append)
+        position: Dict[str, str] = {}
+        last = self.created[-1] if self.created else 0
+
+        def move(rid: str, p: str, k: int, ts: int) -> None:
+            league(league_id); roster(rid); pos(p); kind(k); created(ts)
+
+        for t in txns:
+            if t.get("status") not in _POSTABLE_STATUS:
+                continue
+            roster_ids = t.get("roster_ids")
+            if not roster_ids:
+                continue
+            ttype, ts, rid = t.get("type"), int(t.get("created", 0) or 0), str(roster_ids[0])
+            self._sorted = self._sorted and ts >= last
+            last = ts
+            if ttype in ADD_TYPES:
+                for pid in t.get("adds") or ():
+                    p = position.get(pid) or position.setdefault(pid, players.position(pid))
+                    move(rid, p, ADD, ts)
+            if ttype in DROP_TYPES:
+                for pid in t.get("drops") or ():
+                    p = position.get(pid) or position.setdefault(pid, players.position(pid))
+                    move(rid, p, DROP, ts)
+            if ttype == "trade":
+                for r in roster_ids[:2]:
+                    move(str(r), "", TRADE, ts)
+
+    def sort(self) -> None:
+        """Order rows by created; a no-op for input that arrived in order (TxnStore.window)."""
+        if self._sorted:
+            return
+        order = sorted(range(len(self.created)), key=self.created.__getitem__)
+        self.league = [self.league[i] for i in order]
+        self.roster = [self.roster[i] for i in order]
+        self.pos = [self.pos[i] for i in order]
+        self.kind = array("b", (self.kind[i] for i in order))
+        self.created = array("q", (self.created[i] for i in order))
+        self._sorted = True
+
+    def counts(self, start_ms: int, end_ms: int | None = None) -> Counter:
+        """(league, roster, position, kind) -> rows with start_ms <= created (< end_ms)."""
+        i = bisect_left(self.created, start_ms)
+        j = len(self.created) if end_ms is None else bisect_left(self.created, end_ms, i)
+        return Counter(zip(self.league[i:j], self.roster[i:j], self.pos[i:j], self.kind[i:j]))
+
+    def windows(self, now_ms: int, season_start_ms: int = 0, end_ms: int | None = None) -> Dict[str, Counter]:
+        """Counts per window (see WINDOWS) ending at now_ms; end_ms also drops later rows,
+        so one table can answer "as of" any earlier time (sffl_backfill)."""
+        return {name: self.counts(now_ms - days * DAY_MS if days else season_start_ms, end_ms) for name, days in WINDOWS}
+
+
+def aggregate(txns_by_league: Dict[str, Iterable[dict]], players: PlayerIndex, now_ms: int,
+              season_start_ms: int = 0) -> Dict[str, Counter]:
+    """One pass over every league's transactions -> counts per window (see WINDOWS)."""
+    table = RumorTable()
+    for league_id, txns in txns_by_league.items():
+        table.extend(league_id, txns, players)
+    table.sort()
+    return table.windows(now_ms, season_start_ms)
+
 
+def outliers(counts: Counter, league_id: str, kind: int, n_rosters: int,
+             z: float = RUMOR_Z, min_count: int = RUMOR_MIN_COUNT) -> List[Tuple[str, str, int]]:
+    """(roster, position, count) rows whose count is a z-score outlier among the league's
+    rosters for that position; rosters with no rows count as zero."""
+    groups: Dict[str, Dict[str, int]] = defaultdict(dict)
+    for (lg, rid, pos, k), n in counts.items():
+        if lg == league_id and k == kind:
+            groups[pos][rid] = n
+    out = []
+    for pos, by_roster in groups.items():
+        size = max(n_rosters, len(by_roster))
+        mean = sum(by_roster.values()) / size
+        sd = math.sqrt(max(0.0, sum(n * n for n in by_roster.values()) / size - mean * mean))
+        for rid, n in by_roster.items():
+            if n >= min_count and sd > 0 and (n - mean) / sd >= z:
+                out.append((rid, pos, n))
+    return sorted(out, key=lambda row: (-row[2], row[0], row[1]))
+
+
+def rumor_lines(league_id: str, stats: Dict[str, Counter], teams: Dict[str, str]) -> list:
     lines = ["Rumor Central (last 7 days):"]
-    for rid, pos_counts in adds_pos.items():
-        for pos, n in pos_counts.items():
-            if n >= 3:
-                lines.append(f"Sources: {rid} kicked the tires on {pos} (≥{n} adds). Market watch.")
-    for rid, pos_counts in drops_pos.items():
-        for pos, n in pos_counts.items():
-            if n >= 3:
-                lines.append(f"Whispers: {rid} churning depth at {pos} (≥{n} drops).")
-    for rid, n in trades.items():
-        if n >= 1:
-            lines.append(f"Front office buzz: {rid} completed {n} trade(s) — more calls likely.")
+    week, fortnight, season = stats["7d"], stats["14d"], stats["season"]
+    n_rosters = len(teams)
+    name = lambda rid: teams.get(rid, f"Team {rid}")
+
+    hot_adds = outliers(week, league_id, ADD, n_rosters)
+    for rid, pos, n in hot_adds:
+        lines.append(f"Sources: {name(rid)} kicked the tires on {pos} ({n} adds, "
+                     f"{fortnight[(league_id, rid, pos, ADD)]} in 14 days). Market watch.")
+    for rid, pos, n in outliers(week, league_id, DROP, n_rosters):
+        lines.append(f"Whispers: {name(rid)} churning depth at {pos} ({n} drops, "
+                     f"{season[(league_id, rid, pos, DROP)]} this season).")
+    hot = {(rid, pos) for rid, pos, _ in hot_adds}
+    for rid, pos, n in outliers(season, league_id, ADD, n_rosters):
+        if (rid, pos) not in hot:
+            lines.append(f"Long play: {name(rid)} has cycled through {n} {pos} adds this season, well above the league norm.")
+    for (lg, rid, _, k), n in sorted(week.items(), key=lambda kv: -kv[1]):
+        if lg == league_id and k == TRADE:
+            lines.append(f"Front office buzz: {name(rid)} completed {n} trade(s) — more calls likely.")
 
     if len(lines) == 1:
         lines.append("Quiet week. GMs playing it close to the vest.")
+    return lines
+
+
+def run_league(league: LeagueConfig, snap: LeagueSnapshot | None = None) -> str:
+    """Post the Rumor Central note; a shared `snap` must carry SEASON_WEEKS of history."""
+    league_id = league.league_id
+    snap = snap or fetch_league_snapshot(league_id, weeks_back=SEASON_WEEKS)
+
+    with METRICS.stage("format"):
+        stats = aggregate({league_id: snap.store.window(league_id, 0)}, snap.players, int(time.time() * 1000))
+        lines = rumor_lines(league_id, stats, snap.teams)
+
+    with METRICS.stage("post"):
+        n_posts = bsky_post_thread(league.handle, league.app_password, lines[0], lines[1:])
+    return f"Posted weekly rumor note with {len(lines)-1} insight line(s) in {n_posts} post(s)."
+
+
+def main():
+    # Wednesday 8pm ET guard (Mon=0 -> Wed=2)
+    if not is_now_ny(20, dow=2):
+        print("Skipping: not Wed 8pm New York time.")
+        return
 
-    bsky_post_many(handle, app_pw, lines)
-    print(f"Posted weekly rumor note with {len(lines)-1} insight line(s).")
+    try:
+        leagues = leagues_or_exit()
+        report_leagues(leagues, run_leagues(leagues, run_league))
+    finally:
+        METRICS.emit("weekly_rumors")
 
 
 if __name__ == "__main__":
-    main()
+    with profile_run("weekly_rumors"):
+        main()
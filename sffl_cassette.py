@@ -0,0 +1,135 @@
+"""Record/replay of HTTP traffic so every entry point can run offline.
+
+    SFFL_HTTP_MODE=record  python sffl_bsky_realtime.py   # live run, traffic saved
+    SFFL_HTTP_MODE=replay  python sffl_bsky_realtime.py   # same run, no network
+
+Sleeper and Gist calls (sffl_common.http_request) and Bluesky calls (atproto's httpx
+client, via httpx_transport) are captured per "METHOD url" into SFFL_CASSETTE_DIR.
+Repeated calls to the same URL are kept in order and replayed in order; the last one
+repeats once the sequence runs out. Request headers and bodies are never written.
+Response bodies are, and Bluesky session responses carry tokens, so keep cassettes private.
+SFFL_REPLAY_LATENCY_MS adds a fixed delay per replayed call, or "recorded" replays the
+latency observed while recording.
+"""
+import os, json, time, threading
+from typing import Dict, List, Tuple
+
+MODE = os.getenv("SFFL_HTTP_MODE", "")            # "" | "record" | "replay"
+CASSETTE_DIR = os.getenv("SFFL_CASSETTE_DIR", "cassettes")
+REPLAY_LATENCY = os.getenv("SFFL_REPLAY_LATENCY_MS", "0")
+
+# Transport-level headers that no longer describe the stored (decoded) body.
+_DROP_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "connection", "set-cookie"}
+
+
+class CassetteMiss(LookupError):
+    """Replay asked for a request that was never recorded."""
+
+
+class Cassette:
+    def __init__(self, root: str = CASSETTE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._cursor: Dict[str, int] = {}
+        self._started: set = set()      # keys already rewritten by this recording session
+
+    def _path(self, method: str, url: str) -> str:
+        import hashlib
+        key = hashlib.sha1(f"{method.upper()} {url}".encode()).hexdigest()[:20]
+        return os.path.join(self.root, f"{key}.json")
+
+    def _load(self, path: str) -> List[dict]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)["interactions"]
+        except FileNotFoundError:
+            return []
+
+    def record(self, method: str, url: str, status: int, headers: Dict[str, str], body: bytes, elapsed_ms: float) -> None:
+        import base64
+        path = self._path(method, url)
+        try:
+            text, encoding = body.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            text, encoding = base64.b64encode(body).decode("ascii"), "base64"
+        entry = {
+            "status": status,
+            "headers": {k.lower(): v for k, v in headers.items() if k.lower() not in _DROP_HEADERS},
+            "body": text, "encoding": encoding, "elapsed_ms": round(elapsed_ms, 1),
+        }
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            interactions = [] if path not in self._started else self._load(path)
+            self._started.add(path)
+            interactions.append(entry)
+            tmp = f"{path}.tmp{os.getpid()}"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"method": method.upper(), "url": url, "interactions": interactions}, f, indent=1, sort_keys=True)
+            os.replace(tmp, path)
+
+    def play(self, method: str, url: str) -> Tuple[int, Dict[str, str], bytes]:
+        path = self._path(method, url)
+        with self._lock:
+            interactions = self._load(path)
+            if not interactions:
+                raise CassetteMiss(f"No recording for {method.upper()} {url} in {self.root}")
+            i = self._cursor.get(path, 0)
+            self._cursor[path] = i + 1
+            entry = interactions[min(i, len(interactions) - 1)]
+        delay = entry.get("elapsed_ms", 0) if REPLAY_LATENCY == "recorded" else float(REPLAY_LATENCY or 0)
+        if delay:
+            time.sleep(delay / 1000)
+        import base64
+        body = entry["body"]
+        raw = base64.b64decode(body) if entry.get("encoding") == "base64" else body.encode("utf-8")
+        return entry["status"], entry["headers"], raw
+
+
+_cassette: Cassette | None = None
+
+def cassette() -> Cassette:
+    global _cassette
+    if _cassette is None:
+        _cassette = Cassette()
+    return _cassette
+
+
+# -------- requests (Sleeper, Gist) --------
+def replay_requests(method: str, url: str):
+    import requests
+    from requests.structures import CaseInsensitiveDict
+    status, headers, body = cassette().play(method, url)
+    r = requests.Response()
+    r.status_code, r._content, r.url = status, body, url
+    r._content_consumed = True    # lets iter_content() serve stream=True callers from the body
+    r.headers = CaseInsensitiveDict(headers)
+    r.encoding = "utf-8"
+    r.request = requests.Request(method.upper(), url).prepare()
+    return r
+
+def record_requests(method: str, url: str, resp, elapsed_ms: float) -> None:
+    cassette().record(method, url, resp.status_code, dict(resp.headers), resp.content, elapsed_ms)
+
+
+# -------- httpx (atproto / Bluesky) --------
+def httpx_transport():
+    """httpx transport for the current mode, or None when recording/replay is off."""
+    if MODE not in ("record", "replay"):
+        return None
+    import httpx
+
+    class _Replay(httpx.BaseTransport):
+        def handle_request(self, request: httpx.Request) -> httpx.Response:
+            status, headers, body = cassette().play(request.method, str(request.url))
+            return httpx.Response(status, headers=headers, content=body, request=request)
+
+    class _Record(httpx.HTTPTransport):
+        def handle_request(self, request: httpx.Request) -> httpx.Response:
+            t0 = time.perf_counter()
+            resp = super().handle_request(request)
+            resp.read()
+            cassette().record(request.method, str(request.url), resp.status_code, dict(resp.headers),
+                              resp.content, (time.perf_counter() - t0) * 1000)
+            return resp
+
+    return _Replay() if MODE == "replay" else _Record()
@@ -1,12 +1,380 @@
-import os, sys, json, time
-from typing import Dict, List, Tuple, Set
+from __future__ import annotations
+import os, re, sys, json, time, codecs, sqlite3, random, threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Tuple, Set, Callable, Optional, NamedTuple, Iterable, Iterator, Sequence
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
-import requests
 
-SLEEPER_API = "https://api.sleeper.app/v1"
+import sffl_cassette
+
+# requests (~100 ms to import), atproto and the thread pool load on first use, so the
+# time-guarded jobs skip (half their cron runs) before paying for them. sffl_bench --imports
+# keeps this honest.
+if TYPE_CHECKING:
+    import requests
+
+# Service base URLs; overridable so sffl_e2e can point a run at local stand-ins.
+SLEEPER_API = os.getenv("SFFL_SLEEPER_API", "https://api.sleeper.app/v1")
+GIST_API = os.getenv("SFFL_GIST_API", "https://api.github.com/gists")
+BSKY_PDS = os.getenv("SFFL_BSKY_PDS")    # default: atproto's (bsky.social)
 DRY_RUN = os.getenv("DRY_RUN") == "1"
 DEBUG   = os.getenv("DEBUG") == "1"
+CACHE_DIR = os.getenv("SFFL_CACHE_DIR", ".sffl_cache")
+
+# -------- Run metrics --------
+METRICS_FILE = os.getenv("SFFL_METRICS_FILE")    # append one JSON line per run ("-" = stdout)
+METRICS_PROM = os.getenv("SFFL_METRICS_PROM")    # Prometheus textfile-collector path
+
+class RunMetrics:
+    """Process-wide counters for one run (or one daemon tick): stage wall time, HTTP
+    requests/bytes/status per endpoint, cache hit/miss, posts, created->posted latency."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self.stages: Dict[str, float] = {}
+            self.http: Dict[str, dict] = {}
+            self.cache: Dict[str, Dict[str, int]] = {}
+            self.posts = {"attempted": 0, "succeeded": 0, "given_up": 0}
+            self.post_latency_ms: List[int] = []
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def stage(self, name: str):
+        return _Stage(self, name)
+
+    def http_response(self, endpoint: str, status, nbytes: int = 0) -> None:
+        with self._lock:
+            ep = self.http.setdefault(endpoint, {"requests": 0, "bytes": 0, "status": {}})
+            ep["requests"] += 1
+            ep["bytes"] += nbytes
+            ep["status"][str(status)] = ep["status"].get(str(status), 0) + 1
+
+    def cache_result(self, name: str, hit: bool) -> None:
+        with self._lock:
+            c = self.cache.setdefault(name, {"hit": 0, "miss": 0})
+            c["hit" if hit else "miss"] += 1
+
+    def post_result(self, ok: bool, created_ms: int | None = None) -> None:
+        with self._lock:
+            self.posts["attempted"] += 1
+            if ok:
+                self.posts["succeeded"] += 1
+                if created_ms:
+                    self.post_latency_ms.append(int(time.time()*1000) - created_ms)
+
+    def post_failed(self) -> None:
+        """An outbox post given up on (permanent rejection or out of attempts)."""
+        with self._lock:
+            self.posts["given_up"] += 1
+
+    def snapshot(self, job: str) -> dict:
+        with self._lock:
+            lat = sorted(self.post_latency_ms)
+            pct = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] if lat else None
+            return {
+                "job": job, "ts": int(self.started), "wall_s": round(time.time() - self.started, 3),
+                "stages_s": {k: round(v, 4) for k, v in self.stages.items()},
+                "http": json.loads(json.dumps(self.http)), "cache": json.loads(json.dumps(self.cache)),
+                "posts": dict(self.posts),
+                "post_latency_ms": {"count": len(lat), "p50": pct(0.5), "p95": pct(0.95), "max": lat[-1] if lat else None},
+            }
+
+    def emit(self, job: str) -> None:
+        """Write this run's metrics where configured; a no-op when neither sink is set."""
+        if not METRICS_FILE and not METRICS_PROM:
+            return
+        snap = self.snapshot(job)
+        try:
+            if METRICS_FILE == "-":
+                print(json.dumps(snap, sort_keys=True))
+            elif METRICS_FILE:
+                with open(METRICS_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(snap, sort_keys=True) + "\n")
+            if METRICS_PROM:
+                _write_atomic(METRICS_PROM, prometheus_text(snap))
+        except OSError as e:
+            print(f"Metrics emit skipped: {e}", file=sys.stderr)
+
+class _Stage:
+    def __init__(self, metrics: RunMetrics, name: str):
+        self.metrics, self.name = metrics, name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_stage(self.name, time.perf_counter() - self.t0)
+        if _profiler is not None:
+            _profiler.mark(self.name)
+        return False
+
+def prometheus_text(snap: dict) -> str:
+    job = snap["job"]
+    lines = [f'sffl_run_timestamp_seconds{{job="{job}"}} {snap["ts"]}',
+             f'sffl_run_wall_seconds{{job="{job}"}} {snap["wall_s"]}']
+    lines += [f'sffl_stage_seconds{{job="{job}",stage="{k}"}} {v}' for k, v in sorted(snap["stages_s"].items())]
+    for ep, d in sorted(snap["http"].items()):
+        lines.append(f'sffl_http_bytes_total{{job="{job}",endpoint="{ep}"}} {d["bytes"]}')
+        lines += [f'sffl_http_requests_total{{job="{job}",endpoint="{ep}",status="{st}"}} {n}' for st, n in sorted(d["status"].items())]
+    for name, d in sorted(snap["cache"].items()):
+        lines += [f'sffl_cache_total{{job="{job}",cache="{name}",result="{r}"}} {d[r]}' for r in ("hit", "miss")]
+    lines += [f'sffl_posts_total{{job="{job}",result="{r}"}} {n}' for r, n in sorted(snap["posts"].items())]
+    lat = snap["post_latency_ms"]
+    for q in ("p50", "p95", "max"):
+        if lat[q] is not None:
+            lines.append(f'sffl_post_latency_seconds{{job="{job}",stat="{q}"}} {lat[q] / 1000}')
+    return "\n".join(lines) + "\n"
+
+def _write_atomic(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+METRICS = RunMetrics()
+
+# -------- Profiling (opt-in) --------
+# SFFL_PROFILE=1 (or a subset: "cpu", "mem") wraps an entry point's main() in profile_run().
+# Artifacts go to <SFFL_PROFILE_DIR>/<job>/ and are overwritten per run, so two runs diff:
+#   cprofile.tsv        cumulative/own seconds and calls per function, over every thread
+#   mem-NN-<stage>.tsv  tracemalloc top allocations by line, written as each stage ends
+#   summary.json        peak RSS; tracemalloc current and per-stage peak at every boundary
+# Memory snapshots are written as they are taken, so a run killed mid-way (e.g. OOM while
+# parsing players) still leaves the last boundary it reached.
+PROFILE = os.getenv("SFFL_PROFILE", "")
+PROFILE_DIR = os.getenv("SFFL_PROFILE_DIR", "run-artifacts")
+PROFILE_TOP = int(os.getenv("SFFL_PROFILE_TOP", "30"))
+PROFILE_MAX_MARKS = 98
+
+def _peak_rss_kib() -> int | None:
+    try:
+        import resource
+    except ImportError:   # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak   # bytes on macOS, KiB elsewhere
+
+def _short_path(path: str) -> str:
+    """Source path without the machine-specific prefix (checkout, venv, stdlib dir)."""
+    for root in sorted({os.getcwd(), *sys.path}, key=len, reverse=True):
+        if root and path.startswith(root + os.sep):
+            return path[len(root) + 1:]
+    return path
+
+class _Profiler:
+    def __init__(self, job: str, cpu: bool, mem: bool, root: str = PROFILE_DIR, top: int = PROFILE_TOP):
+        self.job, self.top = job, top
+        self.dir = os.path.join(root, job)
+        self.marks: List[dict] = []
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        os.makedirs(self.dir, exist_ok=True)
+        for name in os.listdir(self.dir):   # last run's stage files, which this run may not repeat
+            if name.startswith("mem-"):
+                os.remove(os.path.join(self.dir, name))
+        self.cpu = None
+        self.thread_cpu: list = []   # one Profile per worker thread, merged by finish()
+        if cpu:
+            import cProfile
+            self.cpu = cProfile.Profile()
+        if mem:
+            import tracemalloc
+            tracemalloc.start()
+        self.mem = mem
+
+    def start(self) -> None:
+        if self.cpu:
+            self.cpu.enable()
+            if sys.version_info < (3, 12):
+                # Before 3.12 a Profile only sees the thread that enabled it, and the fetches
+                # run in pools; each new thread enables its own on its first call. (3.12+
+                # profiles through sys.monitoring, which already covers every thread.)
+                threading.setprofile(self._enable_in_thread)
+
+    def _enable_in_thread(self, _frame, _event, _arg) -> None:
+        import cProfile
+        prof = cProfile.Profile()
+        with self._lock:
+            self.thread_cpu.append(prof)
+        prof.enable()   # replaces this hook for the rest of the thread
+
+    def mark(self, label: str) -> None:
+        """Stage boundary: record tracemalloc current/peak and its top allocations."""
+        if not self.mem:
+            return
+        import tracemalloc
+        with self._lock:
+            if len(self.marks) >= PROFILE_MAX_MARKS and label != "end":
+                return   # a daemon would otherwise write a file per stage per tick forever
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()   # so each stage reports its own peak
+            stats = tracemalloc.take_snapshot().statistics("lineno")
+            n = len(self.marks) + 1
+            self.marks.append({"n": n, "stage": label, "current_kib": current // 1024, "peak_kib": peak // 1024})
+            rows = sorted(((st.size, st.count, f"{_short_path(st.traceback[0].filename)}:{st.traceback[0].lineno}")
+                           for st in stats), key=lambda r: (-r[0], r[2]))[:self.top]
+            _write_atomic(os.path.join(self.dir, f"mem-{n:02d}-{re.sub(r'[^A-Za-z0-9_.]+', '_', label)}.tsv"),
+                          "size_kib\tcount\tline\n" + "".join(f"{size // 1024}\t{count}\t{where}\n" for size, count, where in rows))
+            self._write_summary()
+
+    def _write_summary(self) -> None:
+        summary = {"job": self.job, "wall_s": round(time.perf_counter() - self.started, 3),
+                   "peak_rss_kib": _peak_rss_kib(), "stages": self.marks,
+                   "tracemalloc_peak_kib": max((m["peak_kib"] for m in self.marks), default=None)}
+        _write_atomic(os.path.join(self.dir, "summary.json"), json.dumps(summary, indent=1, sort_keys=True) + "\n")
+
+    def finish(self) -> None:
+        if self.cpu:
+            self.cpu.disable()
+            threading.setprofile(None)
+            import pstats
+            merged = pstats.Stats(self.cpu)
+            with self._lock:
+                for prof in self.thread_cpu:
+                    prof.disable()
+                    merged.add(prof)
+            st = merged.stats   # (file, line, func) -> (primitive calls, calls, own, cumulative, callers)
+            rows = sorted(((ct, tt, nc, f"{_short_path(f)}:{ln}({fn})") for (f, ln, fn), (_cc, nc, tt, ct, _) in st.items()),
+                          key=lambda r: (-r[0], r[3]))
+            _write_atomic(os.path.join(self.dir, "cprofile.tsv"),
+                          "cum_s\town_s\tcalls\tfunction\n" + "".join(f"{ct:.4f}\t{tt:.4f}\t{nc}\t{where}\n" for ct, tt, nc, where in rows))
+        if self.mem:
+            self.mark("end")
+            import tracemalloc
+            tracemalloc.stop()
+        else:
+            with self._lock:
+                self._write_summary()
+
+_profiler: _Profiler | None = None
+
+class profile_run:
+    """Context manager around an entry point's main(); a no-op unless SFFL_PROFILE is set.
+    Artifacts are written even when main() exits through sys.exit or an exception."""
+    def __init__(self, job: str):
+        self.job = job
+
+    def __enter__(self):
+        global _profiler
+        kinds = {k.strip() for k in PROFILE.lower().split(",") if k.strip()}
+        if kinds and _profiler is None:
+            everything = bool(kinds & {"1", "all", "true"})
+            _profiler = _Profiler(self.job, cpu=everything or "cpu" in kinds, mem=everything or "mem" in kinds)
+            _profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        global _profiler
+        if _profiler is not None and _profiler.job == self.job:
+            prof, _profiler = _profiler, None
+            try:
+                prof.finish()
+                print(f"Profile written to {prof.dir}", file=sys.stderr)
+            except OSError as e:
+                print(f"Profile write skipped: {e}", file=sys.stderr)
+        return False
+
+# -------- HTTP client (pooled, retrying) --------
+HTTP_TIMEOUTS = {
+    "state": 15, "users": 30, "rosters": 30, "players": 60, "transactions": 30,
+    "gist": 20, "gist_players": 30,
+}
+HTTP_MAX_RETRIES = int(os.getenv("SFFL_HTTP_RETRIES", "4"))
+HTTP_BACKOFF_BASE = 0.5   # seconds; doubled per attempt, full jitter
+HTTP_BACKOFF_CAP = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+_IDEMPOTENT = {"GET", "HEAD", "OPTIONS", "PUT", "PATCH", "DELETE"}
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+def http_session() -> requests.Session:
+    """Process-wide keep-alive session shared by every Sleeper/GitHub call."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.headers.update({"Accept-Encoding": "gzip, deflate", "User-Agent": "sffl-beat-reporter"})
+                _session = s
+    return _session
+
+def _retry_after(resp: requests.Response) -> float | None:
+    val = resp.headers.get("Retry-After")
+    if not val:
+        return None
+    try:
+        return max(0.0, float(val))
+    except ValueError:
+        from email.utils import parsedate_to_datetime
+        try:
+            return max(0.0, parsedate_to_datetime(val).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(HTTP_BACKOFF_CAP, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+def http_request(method: str, url: str, endpoint: str = "default", timeout: float | None = None, **kw) -> requests.Response:
+    """Send through the shared session, retrying connection errors, 429 and 5xx.
+    Non-idempotent methods (POST) are only retried on 429, which the server never processed.
+    The final response is returned as-is; callers still raise_for_status().
+    SFFL_HTTP_MODE=record|replay captures or serves traffic from cassettes (sffl_cassette)."""
+    method = method.upper()
+    if sffl_cassette.MODE == "replay":
+        r = sffl_cassette.replay_requests(method, url)
+        METRICS.http_response(endpoint, r.status_code, len(r.content))
+        return r
+    t0 = time.perf_counter()
+    r = _http_send(method, url, endpoint, timeout, **kw)
+    if sffl_cassette.MODE == "record":
+        sffl_cassette.record_requests(method, url, r, (time.perf_counter() - t0) * 1000)
+    return r
+
+def _http_send(method: str, url: str, endpoint: str, timeout: float | None, **kw) -> requests.Response:
+    import requests
+    timeout = timeout or HTTP_TIMEOUTS.get(endpoint, 30)
+    attempt = 0
+    while True:
+        try:
+            r = http_session().request(method, url, timeout=timeout, **kw)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            METRICS.http_response(endpoint, "error")
+            if method not in _IDEMPOTENT or attempt >= HTTP_MAX_RETRIES:
+                raise
+            delay, why = _backoff(attempt), type(e).__name__
+        else:
+            retryable = r.status_code in RETRY_STATUSES and (method in _IDEMPOTENT or r.status_code == 429)
+            if not retryable or attempt >= HTTP_MAX_RETRIES:
+                # Streamed bodies are not read here; count what the server announced instead.
+                nbytes = int(r.headers.get("content-length") or 0) if kw.get("stream") else len(r.content)
+                METRICS.http_response(endpoint, r.status_code, nbytes)
+                return r
+            METRICS.http_response(endpoint, r.status_code)
+            ra = _retry_after(r)
+            delay = min(HTTP_BACKOFF_CAP, ra) if ra is not None else _backoff(attempt)
+            why = f"HTTP {r.status_code}"
+            r.close()
+        if DEBUG:
+            print(f"DEBUG: {method} {endpoint} {why}; retry {attempt+1}/{HTTP_MAX_RETRIES} in {delay:.1f}s", file=sys.stderr)
+        time.sleep(delay)
+        attempt += 1
+
+def http_get(url: str, endpoint: str = "default", **kw) -> requests.Response:
+    return http_request("GET", url, endpoint, **kw)
 
 # -------- Time helpers (NY guard) --------
 def is_now_ny(hour: int, dow: int | None = None) -> bool:
@@ -25,32 +393,287 @@ def ny_day_bounds(days_back: int = 0) -> Tuple[int,int]:
     return start, end
 
 # -------- Bluesky --------
-def bsky_post_many(handle: str, app_password: str, posts: List[str]) -> None:
+BSKY_RATE_PER_SEC = float(os.getenv("SFFL_BSKY_RATE_PER_SEC", "1.0"))   # until the PDS tells us otherwise
+BSKY_BURST = float(os.getenv("SFFL_BSKY_BURST", "10"))
+BSKY_MAX_RETRIES = 3
+
+class RateLimiter:
+    """Token bucket re-synced from the PDS's ratelimit-* response headers.
+    ratelimit-policy ("L;w=W") sets the refill rate and bucket size, ratelimit-remaining caps
+    the tokens we think we have, and an exhausted window blocks until ratelimit-reset."""
+    def __init__(self, rate: float = BSKY_RATE_PER_SEC, burst: float = BSKY_BURST):
+        self.rate, self.capacity = rate, burst
+        self.tokens = burst
+        self.blocked_until = 0.0
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.blocked_until and now >= self.blocked_until:
+            # the server's window rolled over: the whole budget is back
+            self.tokens, self.blocked_until = self.capacity, 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def update(self, headers) -> None:
+        policy = headers.get("ratelimit-policy")
+        remaining = headers.get("ratelimit-remaining")
+        reset = headers.get("ratelimit-reset")
+        with self._lock:
+            self._refill(time.monotonic())
+            if policy:
+                try:
+                    limit, _, rest = policy.partition(";")
+                    window = rest.split("w=")[1].split(";")[0]
+                    self.capacity = float(limit)
+                    self.rate = float(limit) / max(1.0, float(window))
+                except (IndexError, ValueError):
+                    pass
+            if remaining is not None:
+                try:
+                    self.tokens = min(self.tokens, float(remaining))
+                except ValueError:
+                    pass
+                if self.tokens < 1 and reset:
+                    self.block_until_epoch(reset)
+
+    def block_until_epoch(self, reset) -> None:
+        try:
+            wait = float(reset) - time.time()
+        except (TypeError, ValueError):
+            return
+        self.blocked_until = max(self.blocked_until, time.monotonic() + max(0.0, wait))
+
+    def block_for(self, seconds: float) -> None:
+        with self._lock:
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, time.monotonic() + max(0.0, seconds))
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self.blocked_until:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.blocked_until - now
+            time.sleep(wait)
+
+_bsky_limiters: Dict[str, RateLimiter] = {}
+_bsky_limiters_lock = threading.Lock()
+
+def bsky_limiter(handle: str) -> RateLimiter:
+    """PDS rate limits are per account, so each handle gets its own bucket."""
+    with _bsky_limiters_lock:
+        return _bsky_limiters.setdefault(handle, RateLimiter())
+
+def bsky_login(handle: str, app_password: str):
+    """Client that resumes the stored session (refreshing it as needed) and only falls back
+    to a password login when there is none or the PDS rejects it. Every response feeds bsky_limiter(handle)."""
+    from atproto import Client, Request, SessionEvent
+    limiter = bsky_limiter(handle)
+    def hook(resp):
+        limiter.update(resp.headers)
+        METRICS.http_response("bsky", resp.status_code, int(resp.headers.get("content-length") or 0))
+    transport = sffl_cassette.httpx_transport()
+    client = Client(BSKY_PDS, request=Request(event_hooks={"response": [hook]}, **({"transport": transport} if transport else {})))
+
+    def on_change(event, session):
+        if event in (SessionEvent.CREATE, SessionEvent.REFRESH):
+            bsky_session_save(handle, app_password, session.encode())
+    client.on_session_change(on_change)
+
+    stored = bsky_session_load(handle, app_password)
+    if stored:
+        try:
+            client.login(session_string=stored)
+            return client
+        except Exception as e:
+            print(f"Stored Bluesky session rejected, logging in: {e}", file=sys.stderr)
+    client.login(handle, app_password)
+    return client
+
+_bsky_clients: Dict[str, object] = {}
+_bsky_clients_lock = threading.Lock()
+
+def bsky_client(handle: str, app_password: str):
+    """Process-wide logged-in client per handle, so jobs sharing a process (sffl_scheduler,
+    the realtime daemon) log in once rather than per run."""
+    with _bsky_clients_lock:
+        client = _bsky_clients.get(handle)
+        if client is None:
+            client = _bsky_clients[handle] = bsky_login(handle, app_password)
+        return client
+
+def bsky_client_drop(handle: str) -> None:
+    """Forget the cached client after a failure that may mean its session went stale."""
+    with _bsky_clients_lock:
+        _bsky_clients.pop(handle, None)
+
+def bsky_send_post(client, text: str, limiter: RateLimiter, created_ms: int | None = None, reply_to=None):
+    """send_post behind the account's rate limiter; a 429 blocks it until the window resets.
+    created_ms (the transaction's) feeds the created->posted latency metric."""
+    from atproto.exceptions import RateLimitExceededError
+    for attempt in range(BSKY_MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            resp = client.send_post(text=text, reply_to=reply_to)
+        except RateLimitExceededError as e:
+            if attempt >= BSKY_MAX_RETRIES:
+                METRICS.post_result(False)
+                raise
+            wait = e.retry_after
+            if wait is None and e.reset_at is not None:
+                wait = e.reset_at.timestamp() - time.time()
+            limiter.block_for(wait if wait is not None else _backoff(attempt + 2))
+            continue
+        except Exception:
+            METRICS.post_result(False)
+            raise
+        METRICS.post_result(True, created_ms)
+        return resp
+
+def bsky_send_chain(client, texts: List[str], limiter: RateLimiter,
+                    created_ms: List[int | None] | None = None, root=None, parent=None):
+    """Send texts as a reply chain, each answering the previous one (and the first answering
+    `parent` under `root`, when given). Returns the (root, last) strong refs."""
+    from atproto import models
+    for i, text in enumerate(texts):
+        reply_to = models.AppBskyFeedPost.ReplyRef(root=root, parent=parent) if root else None
+        resp = bsky_send_post(client, text, limiter, created_ms[i] if created_ms else None, reply_to)
+        parent = models.create_strong_ref(resp)
+        root = root or parent
+    return root, parent
+
+# -------- Post packing (300-grapheme limit) --------
+BSKY_MAX_GRAPHEMES = 300
+_NAME_BREAKS = ("; ", ", ", " and ", " from ")   # trade sides, player lists, add/drop halves
+
+_NON_ASCII = re.compile(r"[^\x00-\x7f]+")
+
+def grapheme_len(text: str) -> int:
+    """Bluesky counts graphemes, not code points. Combining marks, variation selectors, emoji
+    skin tones and ZWJ-joined parts extend the previous character; flag pairs count once.
+    Close enough for names, and it never counts fewer graphemes than there are."""
+    if text.isascii():
+        return len(text)
+    return len(text) - sum(len(m.group()) - _run_graphemes(m.group()) for m in _NON_ASCII.finditer(text))
+
+def _run_graphemes(run: str) -> int:
+    import unicodedata
+    n, joined, flag = 0, False, False
+    for ch in run:
+        o = ord(ch)
+        if joined:
+            joined = False
+            continue
+        if o == 0x200D:
+            joined = True
+            continue
+        if unicodedata.combining(ch) or 0xFE00 <= o <= 0xFE0F or 0x1F3FB <= o <= 0x1F3FF:
+            continue
+        if 0x1F1E6 <= o <= 0x1F1FF:
+            flag = not flag
+            if not flag:
+                continue
+        else:
+            flag = False
+        n += 1
+    return n
+
+def split_line(line: str, limit: int = BSKY_MAX_GRAPHEMES) -> List[str]:
+    """Break an over-long line into pieces of at most `limit` graphemes at the last name
+    boundary that fits (falling back to a space, then a hard cut); continuations are
+    marked with an ellipsis instead of text being truncated."""
+    pieces, start = [], 0                   # start skips the "… " a continuation begins with
+    while grapheme_len(line) > limit:
+        window = line[:limit - 2]          # code points >= graphemes, so this always fits
+        cut, sep = max((window.rfind(sep, start + 1), sep) for sep in _NAME_BREAKS)
+        if cut < 0:
+            cut, sep = window.rfind(" ", start + 1), " "
+        if cut < 0:
+            cut, sep = len(window), ""
+        pieces.append(line[:cut + len(sep.rstrip())] + " …")
+        line, start = "… " + line[cut + len(sep):], 2
+    pieces.append(line)
+    return pieces
+
+def pack_lines(lines: List[str], limit: int = BSKY_MAX_GRAPHEMES, sep: str = "\n") -> List[Tuple[str, List[int]]]:
+    """Greedily fill posts of at most `limit` graphemes with lines, in order (so a digest
+    still reads chronologically); over-long lines are split first (split_line).
+    Returns [(post text, indexes of the lines it carries)]."""
+    posts: List[Tuple[str, List[int]]] = []
+    buf: List[str] = []
+    used, idx = 0, []
+    for i, line in enumerate(lines):
+        n = grapheme_len(line)
+        pieces = [(line, n)] if n <= limit else [(p, grapheme_len(p)) for p in split_line(line, limit)]
+        for piece, n in pieces:
+            if buf and used + len(sep) + n <= limit:
+                buf.append(piece)
+                used += len(sep) + n
+            else:
+                if buf:
+                    posts.append((sep.join(buf), idx))
+                buf, used, idx = [piece], n, []
+            if not idx or idx[-1] != i:
+                idx.append(i)
+    if buf:
+        posts.append((sep.join(buf), idx))
+    return posts
+
+def _dry_run_print(posts: List[str]) -> None:
+    print("\n--- DRY RUN (would post) ---")
+    for p in posts:
+        print(p); print("----------------------------")
+
+def bsky_post_many(handle: str, app_password: str, posts: List[str], client=None,
+                   created_ms: List[int] | None = None) -> None:
+    """Post each line on its own; a line over the limit becomes a short reply chain rather
+    than being truncated. Pass a logged-in `client` to reuse a session across calls.
+    created_ms, parallel to posts, is each line's transaction time (for latency metrics)."""
     if not posts:
         return
     if DRY_RUN:
-        print("\n--- DRY RUN (would post) ---")
-        for p in posts:
-            print(p[:300]); print("----------------------------")
+        _dry_run_print([piece for p in posts for piece in split_line(p)])
         return
-    from atproto import Client
-    client = Client()
-    client.login(handle, app_password)
-    for p in posts:
-        client.send_post(text=(p[:300] if len(p) > 300 else p))
-        time.sleep(1.0)
+    if client is None:
+        client = bsky_client(handle, app_password)
+    for i, p in enumerate(posts):
+        pieces = split_line(p)
+        bsky_send_chain(client, pieces, bsky_limiter(handle), [created_ms[i] if created_ms else None] * len(pieces))
+
+def bsky_post_thread(handle: str, app_password: str, header: str, lines: List[str], client=None,
+                     created_ms: List[int] | None = None) -> int:
+    """Post `header`, then `lines` packed into as few posts as fit (pack_lines), chained as a
+    reply thread under it. A digest of 40 lines goes out in a handful of calls instead of 41.
+    Returns the number of posts sent."""
+    packed = pack_lines(lines)
+    if DRY_RUN:
+        _dry_run_print([header] + [text for text, _ in packed])
+        return 1 + len(packed)
+    if client is None:
+        client = bsky_client(handle, app_password)
+    limiter = bsky_limiter(handle)
+    root, parent = bsky_send_chain(client, [header], limiter)
+    # A packed post is as late as its oldest transaction.
+    times = [min(created_ms[i] for i in idx) for _, idx in packed] if created_ms else None
+    bsky_send_chain(client, [text for text, _ in packed], limiter, times, root, parent)
+    return 1 + len(packed)
 
 # -------- Sleeper API --------
 def get_current_week() -> int:
-    r = requests.get(f"{SLEEPER_API}/state/nfl", timeout=15)
+    r = http_get(f"{SLEEPER_API}/state/nfl", "state")
     r.raise_for_status()
     return int(r.json().get("week", 0) or 0)
 
-def get_league_users(league_id: str) -> Dict[str, str]:
-    r = requests.get(f"{SLEEPER_API}/league/{league_id}/users", timeout=30)
-    r.raise_for_status()
+def parse_users(rows: List[dict]) -> Dict[str, str]:
     out = {}
-    for u in r.json():
+    for u in rows:
         name = (
             u.get("metadata", {}).get("team_name")
             or u.get("display_name")
@@ -60,11 +683,12 @@ def get_league_users(league_id: str) -> Dict[str, str]:
         out[str(u["user_id"])] = name
     return out
 
-def get_rosters(league_id: str) -> Tuple[Dict[str,str], Dict[str,str]]:
-    r = requests.get(f"{SLEEPER_API}/league/{league_id}/rosters", timeout=30)
-    r.raise_for_status()
+def get_league_users(league_id: str) -> Dict[str, str]:
+    return parse_users(league_meta(league_id)["users"])
+
+def parse_rosters(rows: List[dict]) -> Tuple[Dict[str,str], Dict[str,str]]:
     owner_by_roster, teamname_by_roster = {}, {}
-    for row in r.json():
+    for row in rows:
         rid = str(row.get("roster_id"))
         owner_by_roster[rid] = str(row.get("owner_id"))
         tn = row.get("metadata", {}).get("team_name")
@@ -72,16 +696,543 @@ def get_rosters(league_id: str) -> Tuple[Dict[str,str], Dict[str,str]]:
             teamname_by_roster[rid] = tn
     return owner_by_roster, teamname_by_roster
 
-def get_players() -> Dict[str,dict]:
-    r = requests.get(f"{SLEEPER_API}/players/nfl", timeout=60)
+def get_rosters(league_id: str) -> Tuple[Dict[str,str], Dict[str,str]]:
+    return parse_rosters(league_meta(league_id)["rosters"])
+
+# -------- League metadata cache (users, rosters) --------
+LEAGUE_META_TTL_HOURS = float(os.getenv("SFFL_LEAGUE_META_TTL_HOURS", "12"))
+_META_KEYS = {"users": ("user_id", "display_name", "username"), "rosters": ("roster_id", "owner_id")}
+_league_meta: Dict[str, dict] = {}
+_league_meta_locks: Dict[str, threading.Lock] = {}
+_league_meta_guard = threading.Lock()
+
+def _league_meta_path(league_id: str) -> str:
+    return os.path.join(CACHE_DIR, f"league.{league_id}.json")
+
+def _fetch_league_rows(league_id: str, kind: str) -> List[dict]:
+    """/users or /rosters, projected to the fields the parsers read (team names, ownership)."""
+    r = http_get(f"{SLEEPER_API}/league/{league_id}/{kind}", kind)
     r.raise_for_status()
-    return r.json()
+    keys = _META_KEYS[kind]
+    return [{**{k: row.get(k) for k in keys}, "metadata": {"team_name": (row.get("metadata") or {}).get("team_name")}}
+            for row in r.json() or []]
+
+def league_meta(league_id: str, max_age_hours: float = LEAGUE_META_TTL_HOURS, refresh: bool = False) -> dict:
+    """{"users": rows, "rosters": rows, "fetched_ms"} for a league, served from memory or
+    .sffl_cache while younger than the TTL; team names and owners change a handful of
+    times a season. A miss refetches both lists concurrently; if that fails, a stale copy
+    is used rather than failing the run."""
+    with _league_meta_guard:
+        lock = _league_meta_locks.setdefault(league_id, threading.Lock())
+    with lock:   # concurrent users/rosters lookups for one league share a single refresh
+        doc = _league_meta.get(league_id)
+        if doc is None:
+            try:
+                with open(_league_meta_path(league_id), encoding="utf-8") as f:
+                    doc = json.load(f)
+            except (OSError, ValueError):
+                doc = None
+        fresh = doc is not None and not refresh and \
+            int(time.time()*1000) - doc.get("fetched_ms", 0) <= max_age_hours*3600*1000
+        METRICS.cache_result("league_meta", fresh)
+        if fresh:
+            _league_meta[league_id] = doc
+            return doc
+        try:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="sffl-meta") as pool:
+                users, rosters = pool.map(lambda kind: _fetch_league_rows(league_id, kind), ("users", "rosters"))
+        except Exception as e:
+            if doc is None:
+                raise
+            print(f"League metadata refresh failed, using cached copy: {e}", file=sys.stderr)
+            return doc
+        doc = _league_meta[league_id] = {"users": users, "rosters": rosters, "fetched_ms": int(time.time()*1000)}
+        try:
+            _write_atomic(_league_meta_path(league_id), json.dumps(doc, separators=(",", ":")))
+        except OSError as e:
+            print(f"League metadata cache save skipped: {e}", file=sys.stderr)
+        return doc
+
+def league_meta_check(league_id: str, txns: Iterable[dict]) -> bool:
+    """Cheap invalidation: refetch the metadata when a transaction names a roster it does
+    not know (a new or reassigned slot). Returns True when it refreshed."""
+    known = {str(r.get("roster_id")) for r in league_meta(league_id)["rosters"]}
+    if all(str(r) in known for t in txns for r in (t.get("roster_ids") or [])):
+        return False
+    league_meta(league_id, refresh=True)
+    return True
+
+# Fields kept from each /players/nfl entry; everything else (injury notes, ids, ranks...) is dropped while parsing.
+PLAYER_FIELDS = tuple(f.strip() for f in os.getenv("SFFL_PLAYER_FIELDS", "full_name,position,fantasy_positions").split(",") if f.strip())
+_JSON_WS = " \t\n\r"
+
+def iter_json_members(chunks: Iterable[bytes]) -> Iterator[Tuple[str, object]]:
+    """Yield (key, value) for each member of a top-level JSON object arriving as byte chunks.
+    Only the undecoded tail and the member being decoded are held, never the whole document."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf, pos, done = "", 0, False
+
+    def more() -> bool:
+        nonlocal buf, pos, done
+        if done:
+            return False
+        chunk = next(chunks, None)
+        if chunk is None:
+            done = True
+            buf, pos = buf[pos:] + utf8.decode(b"", final=True), 0
+        else:
+            buf, pos = buf[pos:] + utf8.decode(chunk), 0
+        return True
+
+    def token() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _JSON_WS:
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not more():
+                raise ValueError("players payload ended early")
+
+    def value():
+        nonlocal pos
+        while True:
+            token()
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+                # A scalar at the buffer edge may be cut short (123|45); wait for a delimiter.
+                if end < len(buf) or done:
+                    pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if done:
+                    raise
+            more()
+
+    if token() != "{":
+        raise ValueError("players payload is not a JSON object")
+    pos += 1
+    if token() == "}":
+        return
+    while True:
+        key = value()
+        if token() != ":":
+            raise ValueError(f"expected ':' after {key!r}")
+        pos += 1
+        yield key, value()
+        sep = token()
+        pos += 1
+        if sep == "}":
+            return
+        if sep != ",":
+            raise ValueError(f"expected ',' or '}}' after {key!r}")
+
+def parse_players_stream(chunks: Iterable[bytes], fields: Sequence[str] = PLAYER_FIELDS) -> Dict[str,dict]:
+    """Incrementally parse a /players/nfl body, keeping only `fields` of each player."""
+    return {
+        pid: {f: p[f] for f in fields if f in p}
+        for pid, p in iter_json_members(chunks)
+        if isinstance(p, dict)
+    }
+
+def get_players(fields: Optional[Sequence[str]] = PLAYER_FIELDS) -> Dict[str,dict]:
+    """Sleeper's players map, projected to `fields` while the response streams in.
+    fields=None materializes the full payload with r.json() (every field of every player)."""
+    if fields is None:
+        r = http_get(f"{SLEEPER_API}/players/nfl", "players")
+        r.raise_for_status()
+        return r.json()
+    with http_get(f"{SLEEPER_API}/players/nfl", "players", stream=True) as r:
+        r.raise_for_status()
+        return parse_players_stream(r.iter_content(chunk_size=1 << 16), fields)
+
+# -------- Player index (player_id -> name/position) --------
+PLAYER_INDEX_PATH = os.getenv("SFFL_PLAYER_INDEX", os.path.join(CACHE_DIR, "players.sqlite"))
+PLAYER_INDEX_TTL_HOURS = float(os.getenv("SFFL_PLAYER_INDEX_TTL_HOURS", "24"))
+
+class PlayerIndex:
+    """Read-only lookups over the on-disk player index; rows are memoized per process."""
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()   # shared by every league's worker thread
+        self._memo: Dict[str, Tuple[str | None, str | None]] = {}
+
+    def _query(self, sql: str, args: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchone()
+
+    def _row(self, pid: str) -> Tuple[str | None, str | None]:
+        row = self._memo.get(pid)
+        if row is None:
+            hit = self._query("SELECT full_name, position FROM players WHERE player_id = ?", (pid,))
+            row = self._memo[pid] = (hit[0], hit[1]) if hit else (None, None)
+        return row
+
+    def name(self, pid: str) -> str:
+        return self._row(pid)[0] or pid
+
+    def position(self, pid: str) -> str:
+        return self._row(pid)[1] or "?"
+
+    def __contains__(self, pid: str) -> bool:
+        return self._row(pid) != (None, None)
+
+    def __len__(self) -> int:
+        return self._query("SELECT COUNT(*) FROM players")[0]
+
+    def updated_ms(self) -> int:
+        row = self._query("SELECT value FROM meta WHERE key = 'updated_ms'")
+        return int(row[0]) if row else 0
+
+    def reopen(self) -> None:
+        """Switch to a rebuilt file in place, so holders of this instance (and its one
+        connection) carry over instead of leaking a connection per rebuild."""
+        with self._lock:
+            self._conn.close()
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._memo = {}
+
+    def close(self) -> None:
+        self._conn.close()
+
+def player_rows(players: Dict[str,dict]):
+    """Project a raw Sleeper players map down to (player_id, full_name, position) rows.
+    position falls back to the first fantasy position, matching the old infer_position."""
+    for pid, p in players.items():
+        if not isinstance(p, dict):
+            continue
+        pos = p.get("position") or (p.get("fantasy_positions") or [None])[0]
+        yield str(pid), p.get("full_name"), pos
+
+def player_index_build(rows, path: str = PLAYER_INDEX_PATH) -> None:
+    """Write rows to a fresh index file and atomically swap it into place."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("CREATE TABLE players (player_id TEXT PRIMARY KEY, full_name TEXT, position TEXT) WITHOUT ROWID")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.executemany("INSERT OR REPLACE INTO players VALUES (?, ?, ?)", rows)
+        conn.execute("INSERT INTO meta VALUES ('updated_ms', ?)", (str(int(time.time()*1000)),))
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+
+def player_index_fresh(path: str = PLAYER_INDEX_PATH, max_age_hours: float = PLAYER_INDEX_TTL_HOURS) -> bool:
+    if not os.path.exists(path):
+        return False
+    try:
+        idx = PlayerIndex(path)
+        try:
+            ts = idx.updated_ms()
+        finally:
+            idx.close()
+    except sqlite3.Error:
+        return False
+    return (int(time.time()*1000) - ts) <= max_age_hours*3600*1000
+
+_player_indexes: Dict[str, PlayerIndex] = {}
+_player_index_lock = threading.Lock()
+
+def get_player_index(source: Optional[Callable[[], Dict[str,dict]]] = None,
+                     path: str = PLAYER_INDEX_PATH,
+                     max_age_hours: float = PLAYER_INDEX_TTL_HOURS) -> PlayerIndex:
+    """Open the local player index, rebuilding it from `source` (default: Sleeper) when stale.
+    Callers in one process (e.g. one thread per league) share an instance and a single rebuild."""
+    with _player_index_lock:
+        idx = _player_indexes.get(path)
+        if player_index_fresh(path, max_age_hours):
+            METRICS.cache_result("player_index", True)
+            if idx is None:
+                idx = _player_indexes[path] = PlayerIndex(path)
+            return idx
+        METRICS.cache_result("player_index", False)
+        players = (source or get_players)()
+        player_index_build(player_rows(players), path)
+        del players
+        if idx is None:
+            idx = _player_indexes[path] = PlayerIndex(path)
+        else:
+            idx.reopen()
+        return idx
 
 def get_transactions(league_id: str, week: int) -> List[dict]:
-    r = requests.get(f"{SLEEPER_API}/league/{league_id}/transactions/{week}", timeout=30)
+    r = http_get(f"{SLEEPER_API}/league/{league_id}/transactions/{week}", "transactions")
     r.raise_for_status()
     return r.json() or []
 
+def get_transactions_if_changed(league_id: str, week: int, prev: dict | None = None) -> Tuple[List[dict] | None, dict]:
+    """One week's transactions, or None when the payload matches `prev` (the signature this
+    returned last time). ETag/Last-Modified are sent back as conditional headers when the
+    server offered them (a 304 skips the body); otherwise the body's hash decides, before
+    any JSON parsing. Returns (txns or None, signature)."""
+    import hashlib
+    prev = prev or {}
+    headers = {}
+    if prev.get("etag"):
+        headers["If-None-Match"] = prev["etag"]
+    if prev.get("last_modified"):
+        headers["If-Modified-Since"] = prev["last_modified"]
+    r = http_get(f"{SLEEPER_API}/league/{league_id}/transactions/{week}", "transactions", headers=headers)
+    if r.status_code == 304:
+        return None, prev
+    r.raise_for_status()
+    sig = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified"),
+           "digest": hashlib.sha1(r.content).hexdigest()}
+    if sig["digest"] == prev.get("digest"):
+        return None, {**prev, **sig}
+    return r.json() or [], sig
+
+def txn_delta(txns: List[dict], prev_status: Dict[str, str | None], watermark: int = 0) -> List[dict]:
+    """Transactions that are new, or whose status moved, since the payload summarized by
+    prev_status (txn_id -> status) and watermark (its newest created)."""
+    out = []
+    for t in txns:
+        if int(t.get("created", 0) or 0) > watermark:
+            out.append(t)
+            continue
+        tid = str(t.get("transaction_id", ""))
+        if tid not in prev_status or prev_status[tid] != t.get("status"):
+            out.append(t)
+    return out
+
+def txn_summary(txns: List[dict]) -> dict:
+    """What txn_delta needs to diff the next payload against this one."""
+    return {"status": {str(t.get("transaction_id", "")): t.get("status") for t in txns},
+            "watermark": max((int(t.get("created", 0) or 0) for t in txns), default=0)}
+
+# -------- Transaction store (multi-week, indexed by created) --------
+TXN_STORE_PATH = os.getenv("SFFL_TXN_STORE", os.path.join(CACHE_DIR, "transactions.sqlite"))
+
+class TxnStore:
+    """Local SQLite copy of league transactions with an index on created.
+    sync() only refetches weeks that can still change: weeks never fetched, and weeks at or
+    after the watermark (the newest week a previous sync saw as current). The week that just
+    rolled over is therefore fetched one last time, so its late transactions are not lost."""
+    def __init__(self, path: str = TXN_STORE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS txns (
+                league_id TEXT, txn_id TEXT, week INTEGER, created INTEGER, body TEXT,
+                PRIMARY KEY (league_id, txn_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS txns_by_created ON txns (league_id, created);
+            CREATE TABLE IF NOT EXISTS weeks (
+                league_id TEXT, week INTEGER, fetched_ms INTEGER, PRIMARY KEY (league_id, week));
+            CREATE TABLE IF NOT EXISTS watermark (league_id TEXT PRIMARY KEY, week INTEGER);
+        """)
+
+    def watermark(self, league_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT week FROM watermark WHERE league_id = ?", (league_id,)).fetchone()
+        return row[0] if row else -1
+
+    def weeks_to_fetch(self, league_id: str, current_week: int, weeks_back: int = 1) -> List[int]:
+        lo = max(min(1, current_week), current_week - weeks_back)
+        mark = self.watermark(league_id)
+        with self._lock:
+            fetched = {w for (w,) in self._conn.execute("SELECT week FROM weeks WHERE league_id = ?", (league_id,))}
+        return [w for w in range(lo, current_week + 1) if w not in fetched or w >= mark]
+
+    def ingest(self, league_id: str, week: int, txns: List[dict]) -> None:
+        """Replace the stored copy of one week with a fresh listing."""
+        rows = []
+        for t in txns:
+            txn_id = str(t.get("transaction_id", "")) or json.dumps(t, sort_keys=True)[:64]
+            rows.append((league_id, txn_id, week, int(t.get("created", 0) or 0), json.dumps(t, separators=(",", ":"))))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM txns WHERE league_id = ? AND week = ?", (league_id, week))
+            self._conn.executemany("INSERT OR REPLACE INTO txns VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.execute("INSERT OR REPLACE INTO weeks VALUES (?, ?, ?)", (league_id, week, int(time.time()*1000)))
+
+    def fetch(self, league_id: str, weeks: List[int]) -> None:
+        """Fetch the given weeks concurrently and replace their stored copies."""
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(weeks))), thread_name_prefix="sffl-txns") as pool:
+            listings = list(pool.map(lambda w: get_transactions(league_id, w), weeks))
+        for w, txns in zip(weeks, listings):
+            self.ingest(league_id, w, txns)
+
+    def sync(self, league_id: str, current_week: int, weeks_back: int = 1) -> List[int]:
+        """Fetch the weeks that may have changed concurrently; returns the weeks fetched."""
+        weeks = self.weeks_to_fetch(league_id, current_week, weeks_back)
+        self.fetch(league_id, weeks)
+        self._advance_watermark(league_id, current_week)
+        return weeks
+
+    def backfill(self, league_id: str, weeks: List[int], current_week: int, refresh: bool = False) -> List[int]:
+        """Like sync() for an arbitrary week range: weeks already stored and final (before the
+        watermark) are loaded as they are unless refresh is set. Returns the weeks fetched."""
+        mark = self.watermark(league_id)
+        with self._lock:
+            fetched = {w for (w,) in self._conn.execute("SELECT week FROM weeks WHERE league_id = ?", (league_id,))}
+        todo = [w for w in weeks if refresh or w not in fetched or w >= mark]
+        self.fetch(league_id, todo)
+        self._advance_watermark(league_id, current_week)
+        return todo
+
+    def _advance_watermark(self, league_id: str, current_week: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO watermark VALUES (?, MAX(?, COALESCE((SELECT week FROM watermark WHERE league_id = ?), -1)))",
+                               (league_id, current_week, league_id))
+
+    def window(self, league_id: str, start_ms: int, end_ms: int = 2**62) -> List[dict]:
+        """Transactions with start_ms <= created < end_ms, oldest first (index range scan)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT body FROM txns WHERE league_id = ? AND created >= ? AND created < ? ORDER BY created, txn_id",
+                (league_id, start_ms, end_ms)).fetchall()
+        return [json.loads(b) for (b,) in rows]
+
+    def week(self, league_id: str, week: int) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT body FROM txns WHERE league_id = ? AND week = ? ORDER BY created, txn_id", (league_id, week)).fetchall()
+        return [json.loads(b) for (b,) in rows]
+
+_txn_stores: Dict[str, TxnStore] = {}
+_txn_stores_lock = threading.Lock()
+
+def txn_store(path: str = TXN_STORE_PATH) -> TxnStore:
+    """Process-wide TxnStore, so concurrent leagues share one connection."""
+    with _txn_stores_lock:
+        if path not in _txn_stores:
+            _txn_stores[path] = TxnStore(path)
+        return _txn_stores[path]
+
+# -------- League snapshot (concurrent fetch) --------
+@dataclass
+class LeagueSnapshot:
+    league_id: str
+    week: int
+    users: Dict[str,str]
+    owner_by_roster: Dict[str,str]
+    teamname_by_roster: Dict[str,str]
+    players: PlayerIndex
+    txns: List[dict]
+    timings: Dict[str,float] = field(default_factory=dict)   # stage -> seconds
+    store: TxnStore | None = None                               # set when fetched with weeks_back
+    teams: Dict[str,str] = field(init=False)                    # roster_id -> team name
+
+    def __post_init__(self):
+        self.teams = team_names(self.owner_by_roster, self.teamname_by_roster, self.users)
+
+def _timed(timings: Dict[str,float], key: str, fn, *args):
+    t0 = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        timings[key] = time.perf_counter() - t0
+
+def fetch_league_snapshot(league_id: str, week: int | None = None,
+                          users_fn: Callable[[str], Dict[str,str]] | None = None,
+                          players_source: Optional[Callable[[], Dict[str,dict]]] = None,
+                          weeks_back: int | None = None) -> LeagueSnapshot:
+    """Fetch users, rosters, the player index and transactions concurrently.
+    With week=None the current week is looked up first, in the transactions task only.
+    users_fn lets main.py keep its own display-name preference.
+    With weeks_back set, transactions go through the local TxnStore (snap.store), synced
+    back that many weeks so time windows spanning a week rollover are complete."""
+    timings: Dict[str,float] = {}
+    t0 = time.perf_counter()
+    store = txn_store() if weeks_back is not None else None
+
+    def week_and_txns():
+        wk = week if week is not None else _timed(timings, "week", get_current_week)
+        if store is None:
+            return wk, _timed(timings, "transactions", get_transactions, league_id, wk)
+        _timed(timings, "transactions", store.sync, league_id, wk, weeks_back)
+        return wk, store.week(league_id, wk)
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=4, thread_name_prefix="sffl-fetch") as pool:
+        f_users = pool.submit(_timed, timings, "users", users_fn or get_league_users, league_id)
+        f_rosters = pool.submit(_timed, timings, "rosters", get_rosters, league_id)
+        f_players = pool.submit(_timed, timings, "players", get_player_index, players_source)
+        f_txns = pool.submit(week_and_txns)
+        wk, txns = f_txns.result()
+        users, (owner_by_roster, teamname_by_roster) = f_users.result(), f_rosters.result()
+        if league_meta_check(league_id, txns):
+            users, (owner_by_roster, teamname_by_roster) = (users_fn or get_league_users)(league_id), get_rosters(league_id)
+        snap = LeagueSnapshot(league_id, wk, users, owner_by_roster, teamname_by_roster,
+                              f_players.result(), txns, timings, store)
+    timings["total"] = time.perf_counter() - t0
+    for k, v in timings.items():
+        METRICS.add_stage(f"fetch.{k}", v)
+    if _profiler is not None:
+        _profiler.mark("fetch")
+    if DEBUG:
+        print("DEBUG: snapshot timings " + ", ".join(f"{k}={v*1000:.0f}ms" for k, v in timings.items()))
+    return snap
+
+# -------- Leagues (multi-league fan-out) --------
+@dataclass
+class LeagueConfig:
+    league_id: str
+    handle: str | None
+    app_password: str | None
+
+def load_leagues() -> List[LeagueConfig]:
+    """Leagues to run. SFFL_LEAGUES_FILE points at a JSON list of
+    {"league_id", "bsky_handle", "bsky_app_password_env"} objects; otherwise
+    SLEEPER_LEAGUE_ID may hold several comma-separated ids sharing BSKY_HANDLE."""
+    handle, app_pw = os.getenv("BSKY_HANDLE"), os.getenv("BSKY_APP_PASSWORD")
+    path = os.getenv("SFFL_LEAGUES_FILE")
+    if path:
+        with open(path, encoding="utf-8") as f:
+            rows = json.load(f)
+        return [LeagueConfig(str(r["league_id"]),
+                             r.get("bsky_handle") or handle,
+                             os.getenv(r["bsky_app_password_env"]) if r.get("bsky_app_password_env") else app_pw)
+                for r in rows]
+    ids = [x.strip() for x in (os.getenv("SLEEPER_LEAGUE_ID") or "").split(",") if x.strip()]
+    return [LeagueConfig(lid, handle, app_pw) for lid in ids]
+
+def leagues_or_exit(message: str = "Missing env vars") -> List[LeagueConfig]:
+    leagues = load_leagues()
+    if not leagues or not all(lg.handle and lg.app_password for lg in leagues):
+        print(message, file=sys.stderr)
+        sys.exit(1)
+    return leagues
+
+def run_leagues(leagues: List[LeagueConfig], fn: Callable[[LeagueConfig], object]) -> Dict[str, object]:
+    """Run fn for every league concurrently in this process; leagues share the HTTP pool,
+    player index, transaction store and state backend. One league failing does not stop
+    the others; its result is the exception. A single league runs inline."""
+    if len(leagues) == 1:
+        return {leagues[0].league_id: fn(leagues[0])}
+    def guarded(lg: LeagueConfig):
+        try:
+            return fn(lg)
+        except Exception as e:
+            print(f"[{lg.league_id}] failed: {e}", file=sys.stderr)
+            return e
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(8, len(leagues)), thread_name_prefix="sffl-league") as pool:
+        return dict(zip((lg.league_id for lg in leagues), pool.map(guarded, leagues)))
+
+def report_leagues(leagues: List[LeagueConfig], results: Dict[str, object]) -> None:
+    """Print each league's status line (prefixed by league id when there are several);
+    exit non-zero if any league failed."""
+    failed = False
+    for lg in leagues:
+        res = results[lg.league_id]
+        if isinstance(res, Exception):
+            failed = True
+        elif res:
+            print(f"[{lg.league_id}] {res}" if len(leagues) > 1 else res)
+    if failed:
+        sys.exit(1)
+
 # -------- Formatting --------
 def team_name_for(roster_id: str, owner_by_roster: Dict[str,str], teamname_by_roster: Dict[str,str], users: Dict[str,str]) -> str:
     if roster_id in teamname_by_roster:
@@ -91,135 +1242,551 @@ def team_name_for(roster_id: str, owner_by_roster: Dict[str,str], teamname_by_ro
         return users[owner_id]
     return f"Team {roster_id}"
 
-def format_txn_lines(txns: List[dict], players: Dict[str,dict],
-                     users: Dict[str,str], owner_by_roster: Dict[str,str],
-                     teamname_by_roster: Dict[str,str]) -> List[Tuple[str, str, int]]:
-    """
-    Returns list of tuples: (txn_id, text, created_ts_ms)
-    """
+def team_names(owner_by_roster: Dict[str,str], teamname_by_roster: Dict[str,str], users: Dict[str,str]) -> Dict[str,str]:
+    """roster_id -> display team name, resolved once per snapshot instead of per transaction."""
+    rids = set(owner_by_roster) | set(teamname_by_roster)
+    return {rid: team_name_for(rid, owner_by_roster, teamname_by_roster, users) for rid in rids}
+
+class TxnStyle(NamedTuple):
+    """Bound str.format templates for one voice. Fields: team, adds, drops, other, names, sides."""
+    add_drop: Callable[..., str]
+    add: Callable[..., str]
+    drop: Callable[..., str]
+    trade_side: Callable[..., str]
+    trade: Callable[..., str]
+
+def _style(add_drop: str, add: str, drop: str, trade_side: str, trade: str) -> TxnStyle:
+    return TxnStyle(add_drop.format, add.format, drop.format, trade_side.format, trade.format)
+
+TXN_STYLES: Dict[str, TxnStyle] = {
+    # Bluesky beat-reporter voice (realtime, daily digest)
+    "beat": _style(
+        "Beat Reporter: {team} added {adds} and dropped {drops}.",
+        "Beat Reporter: {team} added {adds}.",
+        "Beat Reporter: {team} dropped {drops}.",
+        "{team} receive {names} from {other}",
+        "SPECIAL ALERT: Trade finalized — {sides}.",
+    ),
+    # plain weekly recap voice (main.py)
+    "plain": _style(
+        "{team} added {adds} and dropped {drops}.",
+        "{team} added {adds}.",
+        "{team} dropped {drops}.",
+        "{team} received {names} from {other}",
+        "Trade: {sides}.",
+    ),
+}
+
+_ADD_DROP_TYPES = frozenset({"waiver", "free_agent", "waivers", "add", "drop"})
+_POSTABLE_STATUS = frozenset({None, "complete", "processed"})
+
+def render_txns(txns: List[dict], players: PlayerIndex, teams: Dict[str,str],
+                style: str = "beat") -> List[Tuple[str, str, int]]:
+    """One pass over txns -> [(txn_id, text, created_ms)] using a precomputed team table
+    (see team_names); rosters missing from it render as "Team <id>"."""
+    tpl = TXN_STYLES[style]
+    name = players.name
+    def team(rid: str) -> str:
+        return teams.get(rid) or f"Team {rid}"
     out: List[Tuple[str,str,int]] = []
+    append = out.append
     for t in txns:
-        status = t.get("status")
-        if status not in (None, "complete", "processed"):
+        if t.get("status") not in _POSTABLE_STATUS:
             continue
-        txn_id = str(t.get("transaction_id", "")) or json.dumps(t, sort_keys=True)[:64]
-        created = int(t.get("created", 0) or 0)
         ttype = t.get("type")
-        roster_ids = [str(r) for r in (t.get("roster_ids") or [])]
-        if ttype in {"waiver","free_agent","waivers","add","drop"}:
+        roster_ids = t.get("roster_ids") or []
+        if ttype in _ADD_DROP_TYPES:
             if not roster_ids:
                 continue
-            rid = roster_ids[0]
-            team = team_name_for(rid, owner_by_roster, teamname_by_roster, users)
             adds = t.get("adds") or {}
             drops = t.get("drops") or {}
-            add_names  = [players.get(pid, {}).get("full_name", pid) for pid in adds.keys()]
-            drop_names = [players.get(pid, {}).get("full_name", pid) for pid in drops.keys()]
-            if add_names and drop_names:
-                out.append((txn_id, f"Beat Reporter: {team} added {', '.join(add_names)} and dropped {', '.join(drop_names)}.", created))
-            elif add_names:
-                out.append((txn_id, f"Beat Reporter: {team} added {', '.join(add_names)}.", created))
-            elif drop_names:
-                out.append((txn_id, f"Beat Reporter: {team} dropped {', '.join(drop_names)}.", created))
+            if not adds and not drops:
+                continue
+            tm = team(str(roster_ids[0]))
+            if adds and drops:
+                text = tpl.add_drop(team=tm, adds=", ".join(map(name, adds)), drops=", ".join(map(name, drops)))
+            elif adds:
+                text = tpl.add(team=tm, adds=", ".join(map(name, adds)))
+            else:
+                text = tpl.drop(team=tm, drops=", ".join(map(name, drops)))
         elif ttype == "trade":
             if len(roster_ids) < 2:
                 continue
-            rid_a, rid_b = roster_ids[0], roster_ids[1]
-            team_a = team_name_for(rid_a, owner_by_roster, teamname_by_roster, users)
-            team_b = team_name_for(rid_b, owner_by_roster, teamname_by_roster, users)
-            adds = t.get("adds") or {}  # pid -> to_roster_id
+            rid_a, rid_b = str(roster_ids[0]), str(roster_ids[1])
             a_recv, b_recv = [], []
-            for pid, to_r in adds.items():
-                name = players.get(pid, {}).get("full_name", pid)
-                if str(to_r) == rid_a: a_recv.append(name)
-                elif str(to_r) == rid_b: b_recv.append(name)
-            parts = []
-            if a_recv: parts.append(f"{team_a} receive {', '.join(a_recv)} from {team_b}")
-            if b_recv: parts.append(f"{team_b} receive {', '.join(b_recv)} from {team_a}")
-            if parts:
-                out.append((txn_id, "SPECIAL ALERT: Trade finalized — " + "; ".join(parts) + ".", created))
+            for pid, to_r in (t.get("adds") or {}).items():   # pid -> to_roster_id
+                to_r = str(to_r)
+                if to_r == rid_a: a_recv.append(name(pid))
+                elif to_r == rid_b: b_recv.append(name(pid))
+            if not a_recv and not b_recv:
+                continue
+            team_a, team_b = team(rid_a), team(rid_b)
+            sides = []
+            if a_recv: sides.append(tpl.trade_side(team=team_a, names=", ".join(a_recv), other=team_b))
+            if b_recv: sides.append(tpl.trade_side(team=team_b, names=", ".join(b_recv), other=team_a))
+            text = tpl.trade(sides="; ".join(sides))
+        else:
+            continue
+        txn_id = str(t.get("transaction_id", "")) or json.dumps(t, sort_keys=True)[:64]
+        append((txn_id, text, int(t.get("created", 0) or 0)))
     return out
 
-# -------- Gist state (de-dupe) --------
+def format_txn_lines(txns: List[dict], players: PlayerIndex,
+                     users: Dict[str,str], owner_by_roster: Dict[str,str],
+                     teamname_by_roster: Dict[str,str]) -> List[Tuple[str, str, int]]:
+    """
+    Returns list of tuples: (txn_id, text, created_ts_ms) in the Beat Reporter voice.
+    """
+    return render_txns(txns, players, team_names(owner_by_roster, teamname_by_roster, users))
+
+# -------- State storage backends --------
+STATE_BACKEND = os.getenv("SFFL_STATE_BACKEND", "gist")    # "gist" | "file"
+STATE_DIR = os.getenv("SFFL_STATE_DIR", os.path.join(CACHE_DIR, "state"))
+
 def _gist_headers():
     tok = os.getenv("GH_TOKEN")
     return {"Authorization": f"token {tok}"} if tok else {}
 
-def state_load() -> Set[str]:
-    tok = os.getenv("GH_TOKEN"); gid = os.getenv("GH_GIST_ID")
-    if not tok or not gid: return set()
-    try:
-        gr = requests.get(f"https://api.github.com/gists/{gid}", headers=_gist_headers(), timeout=20)
-        gr.raise_for_status()
-        files = gr.json().get("files", {})
-        content = files.get("state.json", {}).get("content", "")
-        return set(json.loads(content).get("posted_ids", [])) if content else set()
-    except Exception as e:
-        print(f"State load skipped: {e}", file=sys.stderr); return set()
+class GistStore:
+    """Named text documents kept as files of one GitHub Gist, whose id comes from `gist_env`.
+    With create=True a missing Gist is created on first write (its id exported to
+    this process, never printed: Actions logs may be public).
+    Files listed in drop_files are deleted by the next write if a read saw them, as are
+    files written as None (deleting a file the Gist does not have is an error)."""
+    def __init__(self, gist_env: str, endpoint: str = "gist", create: bool = False, drop_files: Tuple[str, ...] = ()):
+        self.gist_env, self.endpoint, self.create = gist_env, endpoint, create
+        self.drop_files = drop_files
+        self._drop_pending: Set[str] = set()
+        self._seen: Set[str] = set()
 
-def state_save(posted_ids: Set[str]) -> None:
-    tok = os.getenv("GH_TOKEN"); gid = os.getenv("GH_GIST_ID")
-    if not tok: return
-    payload = {"files": {"state.json": {"content": json.dumps({"posted_ids": sorted(list(posted_ids))}, indent=2)}}}
-    try:
-        if gid:
-            r = requests.patch(f"https://api.github.com/gists/{gid}", headers=_gist_headers(), json=payload, timeout=20)
+    @property
+    def gist_id(self) -> str | None:
+        return os.getenv(self.gist_env)
+
+    def readable(self) -> bool:
+        return bool(os.getenv("GH_TOKEN") and self.gist_id)
+
+    def writable(self) -> bool:
+        return bool(os.getenv("GH_TOKEN") and (self.gist_id or self.create))
+
+    def read_many(self, names: List[str]) -> Dict[str, str | None]:
+        r = http_get(f"{GIST_API}/{self.gist_id}", self.endpoint, headers=_gist_headers())
+        r.raise_for_status()
+        files = r.json().get("files", {})
+        self._drop_pending.update(f for f in self.drop_files if f in files)
+        self._seen = set(files)
+        out = {}
+        for n in names:
+            meta = files.get(n) or {}
+            if meta.get("truncated") and meta.get("raw_url"):
+                # The API inlines at most ~1 MB of a file; raw_url serves all of it.
+                raw = http_get(meta["raw_url"], self.endpoint, headers=_gist_headers())
+                raw.raise_for_status()
+                out[n] = raw.text or None
+            else:
+                out[n] = meta.get("content") or None
+        return out
+
+    def read(self, name: str) -> str | None:
+        return self.read_many([name])[name]
+
+    def write(self, docs: Dict[str, str | None]) -> None:
+        files: Dict[str, dict | None] = {k: ({"content": v} if v is not None else None)
+                                         for k, v in docs.items() if v is not None or k in self._seen}
+        if self.gist_id:
+            files.update({f: None for f in self._drop_pending})
+            r = http_request("PATCH", f"{GIST_API}/{self.gist_id}", self.endpoint, headers=_gist_headers(), json={"files": files})
             r.raise_for_status()
+            self._drop_pending.clear()
         else:
-            create = {"description": "SFFL Beat Reporter state", "public": False, "files": payload["files"]}
-            r = requests.post("https://api.github.com/gists", headers=_gist_headers(), json=create, timeout=20)
+            create = {"description": "SFFL Beat Reporter state", "public": False, "files": files}
+            r = http_request("POST", GIST_API, self.endpoint, headers=_gist_headers(), json=create)
             r.raise_for_status()
-            new_id = r.json().get("id")
-            print(f"Created Gist state store: {new_id}")
-            os.environ["GH_GIST_ID"] = new_id
+            # The id is not printed: Actions logs may be public, and the Gist is only unlisted.
+            os.environ[self.gist_env] = r.json().get("id")
+            print(f"Created a secret Gist state store; set {self.gist_env} to its id (see your Gists).")
+
+class FileStore:
+    """Named text documents as files under `root`, replaced atomically on write."""
+    def __init__(self, root: str):
+        self.root = root
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def read(self, name: str) -> str | None:
+        try:
+            with open(os.path.join(self.root, name), encoding="utf-8") as f:
+                return f.read() or None
+        except FileNotFoundError:
+            return None
+
+    def read_many(self, names: List[str]) -> Dict[str, str | None]:
+        return {n: self.read(n) for n in names}
+
+    def write(self, docs: Dict[str, str | None]) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        for name, content in docs.items():
+            path = os.path.join(self.root, name)
+            if content is None:
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            tmp = f"{path}.tmp{os.getpid()}"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+
+_stores: Dict[str, object] = {}
+
+def _store(kind: str):
+    store = _stores.get(kind)
+    if store is None:
+        if STATE_BACKEND == "file":
+            store = FileStore(STATE_DIR)
+        elif STATE_BACKEND == "gist":
+            if kind == "players":
+                # players.json is the pre-sharding plain copy; the next save removes it.
+                store = GistStore("GH_PLAYERS_GIST_ID", "gist_players", drop_files=("players.json",))
+            else:
+                # Players used to live in the state Gist; drop them so state reads stay small.
+                # bsky_session.json held a plaintext session (see bsky_session_save).
+                store = GistStore("GH_GIST_ID", create=True, drop_files=("players.json", "players_meta.json", "bsky_session.json"))
+        else:
+            raise ValueError(f"Unknown SFFL_STATE_BACKEND: {STATE_BACKEND!r}")
+        _stores[kind] = store
+    return store
+
+def state_store():
+    """Backend holding de-dupe state and the Bluesky session."""
+    return _store("state")
+
+def players_store():
+    """Backend holding the players cache (a separate Gist under the gist backend)."""
+    return _store("players")
+
+# -------- De-dupe state --------
+STATE_RETAIN_WEEKS = int(os.getenv("SFFL_STATE_RETAIN_WEEKS", "4"))
+
+# posted txn_id -> created_ms of the transaction (or first-seen time for legacy ids)
+PostedIds = Dict[str, int]
+
+def state_evict(posted: PostedIds, retain_weeks: int = STATE_RETAIN_WEEKS) -> PostedIds:
+    """Drop entries older than the retention window; Sleeper never re-serves them to a poller."""
+    cutoff = int(time.time()*1000) - retain_weeks*7*86400*1000
+    return {tid: ts for tid, ts in posted.items() if ts >= cutoff}
+
+def state_decode(content: str | None) -> PostedIds:
+    if not content:
+        return {}
+    doc = json.loads(content)
+    if "posted" in doc:
+        return {str(k): int(v) for k, v in doc["posted"].items()}
+    # v1: bare sorted list of ids with no timestamps; age them from now
+    now_ms = int(time.time()*1000)
+    return {str(tid): now_ms for tid in doc.get("posted_ids", [])}
+
+def state_encode(posted: PostedIds) -> str:
+    return json.dumps({"v": 2, "posted": state_evict(posted)}, separators=(",", ":"), sort_keys=True)
+
+def _state_doc(namespace: str | None) -> str:
+    return f"state.{namespace}.json" if namespace else "state.json"
+
+def state_load(namespace: str | None = None) -> PostedIds:
+    """Posted ids for one dedupe namespace (a league id in multi-league runs).
+    A namespace with no document yet is seeded from the shared state.json; Sleeper
+    transaction ids are global, so the seed can only suppress true duplicates."""
+    store = state_store()
+    if not store.readable(): return {}
+    try:
+        doc = _state_doc(namespace)
+        docs = store.read_many(list(dict.fromkeys([doc, "state.json"])))
+        content = docs[doc] or docs["state.json"]
+        METRICS.cache_result("state", bool(content))
+        return state_decode(content)
+    except Exception as e:
+        print(f"State load skipped: {e}", file=sys.stderr); return {}
+
+def state_save(posted: PostedIds, namespace: str | None = None) -> None:
+    store = state_store()
+    if not store.writable(): return
+    try:
+        store.write({_state_doc(namespace): state_encode(posted)})
     except Exception as e:
         print(f"State save skipped: {e}", file=sys.stderr)
 
+# -------- Outbox (durable, per-post acknowledged posting) --------
+OUTBOX_PATH = os.getenv("SFFL_OUTBOX", os.path.join(CACHE_DIR, "outbox.sqlite"))
+OUTBOX_WORKERS = int(os.getenv("SFFL_OUTBOX_WORKERS", "2"))
+OUTBOX_MAX_WAIT_SECS = float(os.getenv("SFFL_OUTBOX_MAX_WAIT_SECS", "60"))   # longest in-run wait for a retry
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("SFFL_OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_RETRY_BASE_SECS = 5.0
+OUTBOX_RETRY_CAP_SECS = 900.0
+_PERMANENT_POST_STATUSES = {400, 413}   # the PDS rejected the record itself; resending cannot help
+
+def _outbox_delay(attempts: int) -> float:
+    """Seconds before retry number `attempts` (1-based): doubling from OUTBOX_RETRY_BASE_SECS
+    up to OUTBOX_RETRY_CAP_SECS, jittered over the upper half so it actually reaches the cap."""
+    delay = min(OUTBOX_RETRY_CAP_SECS, OUTBOX_RETRY_BASE_SECS * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+class Outbox:
+    """Rendered posts queued on disk by (league_id, txn_id) until Bluesky accepts them.
+    enqueue() ignores ids already queued, sent or failed, and drain() acks each post the
+    moment it succeeds, so a crash or rate limit mid-burst neither reposts what went out nor
+    drops what did not. Failed posts stay pending with jittered exponential backoff (see
+    _outbox_delay) and are retried by later drains, until a permanent rejection (HTTP 400/413)
+    or OUTBOX_MAX_ATTEMPTS marks them failed: kept, reported, and no longer queued."""
+    def __init__(self, path: str = OUTBOX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                league_id TEXT, txn_id TEXT, text TEXT, created_ms INTEGER,
+                sent_ms INTEGER, attempts INTEGER DEFAULT 0, next_ms INTEGER DEFAULT 0, error TEXT,
+                PRIMARY KEY (league_id, txn_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (league_id, sent_ms, next_ms);
+        """)
+        if "failed_ms" not in {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}:
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN failed_ms INTEGER")
+
+    def enqueue(self, league_id: str, items: Iterable[Tuple[str, str, int]]) -> int:
+        """Queue (txn_id, text, created_ms) rows; returns how many were new."""
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO outbox (league_id, txn_id, text, created_ms) VALUES (?, ?, ?, ?)",
+                [(league_id, tid, text, created or 0) for tid, text, created in items])
+            return self._conn.total_changes - before
+
+    def queued(self, league_id: str) -> Set[str]:
+        """Txn ids still waiting to be posted (due now or backing off)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT txn_id FROM outbox WHERE league_id = ? AND sent_ms IS NULL AND failed_ms IS NULL", (league_id,))
+            return {tid for (tid,) in rows}
+
+    def failed(self, league_id: str) -> Dict[str, str]:
+        """Txn ids given up on -> last error."""
+        with self._lock:
+            rows = self._conn.execute("SELECT txn_id, error FROM outbox WHERE league_id = ? AND failed_ms IS NOT NULL", (league_id,))
+            return {tid: error or "" for tid, error in rows}
+
+    def acked(self, league_id: str) -> PostedIds:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT txn_id, created_ms, sent_ms FROM outbox WHERE league_id = ? AND sent_ms IS NOT NULL", (league_id,))
+            return {tid: created or sent for tid, created, sent in rows}
+
+    def _due(self, league_id: str, now_ms: int) -> List[Tuple[str, str, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT txn_id, text, created_ms FROM outbox WHERE league_id = ? AND sent_ms IS NULL AND failed_ms IS NULL AND next_ms <= ? "
+                "ORDER BY created_ms, txn_id", (league_id, now_ms)).fetchall()
+
+    def _next_ms(self, league_id: str) -> int | None:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT MIN(next_ms) FROM outbox WHERE league_id = ? AND sent_ms IS NULL AND failed_ms IS NULL",
+                (league_id,)).fetchone()[0]
+
+    def ack(self, league_id: str, txn_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE outbox SET sent_ms = ?, error = NULL WHERE league_id = ? AND txn_id = ?",
+                               (int(time.time()*1000), league_id, txn_id))
+
+    def nack(self, league_id: str, txn_id: str, error: str, permanent: bool = False) -> bool:
+        """Record a failed attempt; returns True when the post is now marked failed."""
+        with self._lock, self._conn:
+            (attempts,) = self._conn.execute("SELECT attempts FROM outbox WHERE league_id = ? AND txn_id = ?",
+                                             (league_id, txn_id)).fetchone()
+            attempts += 1
+            now = time.time()
+            give_up = permanent or attempts >= OUTBOX_MAX_ATTEMPTS
+            self._conn.execute(
+                "UPDATE outbox SET attempts = ?, next_ms = ?, error = ?, failed_ms = ? WHERE league_id = ? AND txn_id = ?",
+                (attempts, int((now + _outbox_delay(attempts))*1000), error[:500],
+                 int(now*1000) if give_up else None, league_id, txn_id))
+            return give_up
+
+    def prune(self, retain_weeks: int = STATE_RETAIN_WEEKS) -> None:
+        """Forget acked and failed rows past the de-dupe retention window (state_evict drops them too)."""
+        cutoff = int(time.time()*1000) - retain_weeks*7*86400*1000
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM outbox WHERE sent_ms < ? OR failed_ms < ?", (cutoff, cutoff))
+
+    def drain(self, league_id: str, send: Callable[[str, int], object],
+              on_ack: Callable[[str, int], None] | None = None,
+              workers: int = OUTBOX_WORKERS, max_wait: float = OUTBOX_MAX_WAIT_SECS) -> Tuple[int, int]:
+        """Post due rows with send(text, created_ms) on up to `workers` threads, oldest first.
+        Each success is acked (and reported to on_ack) by its worker as soon as send returns.
+        Retries due within max_wait seconds are waited for; later ones are left for the next
+        drain. Returns (posted, still queued)."""
+        from concurrent.futures import ThreadPoolExecutor
+        def post(row) -> bool:
+            tid, text, created = row
+            try:
+                send(text, created)
+            except Exception as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if self.nack(league_id, tid, f"{type(e).__name__}: {e}", permanent=status in _PERMANENT_POST_STATUSES):
+                    print(f"Post {tid} failed permanently, giving up: {e}", file=sys.stderr)
+                    METRICS.post_failed()
+                else:
+                    print(f"Post {tid} failed, will retry: {e}", file=sys.stderr)
+                return False
+            self.ack(league_id, tid)
+            if on_ack:
+                on_ack(tid, created)
+            return True
+
+        posted, deadline = 0, time.monotonic() + max_wait
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="sffl-outbox") as pool:
+            while True:
+                due = self._due(league_id, int(time.time()*1000))
+                if due:
+                    posted += sum(pool.map(post, due))
+                    continue
+                nxt = self._next_ms(league_id)
+                if nxt is None:
+                    break
+                wait = max(0.0, nxt / 1000 - time.time())
+                if time.monotonic() + wait > deadline:
+                    break
+                time.sleep(wait)
+        self.prune()
+        return posted, len(self.queued(league_id))
+
+_outboxes: Dict[str, Outbox] = {}
+_outboxes_lock = threading.Lock()
+
+def outbox(path: str = OUTBOX_PATH) -> Outbox:
+    """Process-wide Outbox, so concurrent leagues share one connection."""
+    with _outboxes_lock:
+        if path not in _outboxes:
+            _outboxes[path] = Outbox(path)
+        return _outboxes[path]
+
+# -------- Bluesky session (stored next to the de-dupe state) --------
+# One document per handle, so leagues posting as different accounts (SFFL_LEAGUES_FILE) never
+# overwrite each other's session. The session string carries refresh tokens good for months
+# and a secret Gist is only unlisted, so it is stored AES-GCM encrypted under a key derived
+# from the account's app password; rotating the password just forces one fresh login.
+BSKY_SESSION_KDF_ROUNDS = 100_000
+
+def _bsky_session_doc(handle: str) -> str:
+    return f"bsky_session.{re.sub(r'[^A-Za-z0-9._-]', '_', handle)}.json"
+
+def _bsky_session_cipher(handle: str, app_password: str):
+    import hashlib
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM   # atproto dependency
+    key = hashlib.pbkdf2_hmac("sha256", app_password.encode("utf-8"), f"sffl-bsky-session:{handle}".encode("utf-8"),
+                              BSKY_SESSION_KDF_ROUNDS)
+    return AESGCM(key)
+
+def bsky_session_load(handle: str, app_password: str) -> str | None:
+    store = state_store()
+    if not store.readable(): return None
+    try:
+        import base64
+        content = store.read(_bsky_session_doc(handle))
+        doc = json.loads(content) if content else {}
+        if doc.get("handle") != handle or "sealed" not in doc:
+            return None
+        raw = base64.b64decode(doc["sealed"])
+        return _bsky_session_cipher(handle, app_password).decrypt(raw[:12], raw[12:], handle.encode("utf-8")).decode("utf-8")
+    except Exception as e:
+        print(f"Bluesky session load skipped: {str(e) or type(e).__name__}", file=sys.stderr); return None
+
+def bsky_session_save(handle: str, app_password: str, session_string: str) -> None:
+    store = state_store()
+    if not (store.readable() and store.writable()): return
+    try:
+        import base64
+        nonce = os.urandom(12)
+        sealed = nonce + _bsky_session_cipher(handle, app_password).encrypt(nonce, session_string.encode("utf-8"), handle.encode("utf-8"))
+        store.write({_bsky_session_doc(handle): json.dumps({"handle": handle, "sealed": base64.b64encode(sealed).decode("ascii")})})
+    except Exception as e:
+        print(f"Bluesky session save skipped: {e}", file=sys.stderr)
+
+# -------- Optional players cache --------
+# Stored as players_meta.json plus players.<n>.b64 shards: the (player_id, full_name, position)
+# rows the index needs, gzip-compressed and base64-encoded, split so no file nears the Gist
+# API's inline limit. The meta records the shard count and a sha256 of the decoded rows, so
+# a partial or stale write is detected on load instead of half-parsing.
+PLAYERS_CACHE_SHARD_CHARS = 512 * 1024
+PLAYERS_CACHE_MAX_SHARDS = 8
+PLAYERS_CACHE_FORMAT = 2
+
+def _players_shard(i: int) -> str:
+    return f"players.{i}.b64"
+
+def players_cache_encode(players: Dict[str,dict]) -> Dict[str, str]:
+    """Players map -> {file name: content} for the meta document and every shard."""
+    import base64, gzip, hashlib
+    projected = sorted(player_rows(players))
+    rows = json.dumps(projected, separators=(",", ":")).encode("utf-8")
+    blob = base64.b64encode(gzip.compress(rows, mtime=0)).decode("ascii")
+    shards = [blob[i:i + PLAYERS_CACHE_SHARD_CHARS] for i in range(0, len(blob), PLAYERS_CACHE_SHARD_CHARS)] or [""]
+    if len(shards) > PLAYERS_CACHE_MAX_SHARDS:
+        raise ValueError(f"players cache needs {len(shards)} shards (max {PLAYERS_CACHE_MAX_SHARDS})")
+    meta = {"updated_ms": int(time.time()*1000), "format": PLAYERS_CACHE_FORMAT, "shards": len(shards),
+            "sha256": hashlib.sha256(rows).hexdigest(), "count": len(projected)}
+    docs = {_players_shard(i): shard for i, shard in enumerate(shards)}
+    docs["players_meta.json"] = json.dumps(meta)
+    return docs
+
+def players_cache_decode(docs: Dict[str, str | None], max_age_hours: float) -> dict | None:
+    """Inverse of players_cache_encode; None when stale, incomplete or failing its hash."""
+    import base64, gzip, hashlib
+    meta = json.loads(docs.get("players_meta.json") or "{}")
+    if meta.get("format") != PLAYERS_CACHE_FORMAT:
+        return None
+    if (int(time.time()*1000) - meta.get("updated_ms", 0)) > max_age_hours*3600*1000:
+        return None
+    shards = [docs.get(_players_shard(i)) for i in range(meta["shards"])]
+    if any(shard is None for shard in shards):
+        raise ValueError(f"players cache is missing shards ({meta['shards']} expected)")
+    rows = gzip.decompress(base64.b64decode("".join(shards)))
+    if hashlib.sha256(rows).hexdigest() != meta["sha256"]:
+        raise ValueError("players cache failed its content hash")
+    return {pid: {"full_name": name, "position": pos} for pid, name, pos in json.loads(rows)}
 
-                               # ---------- Optional players cache via Gist ----------
 def players_cache_load(max_age_hours: int = 24) -> dict | None:
-    tok = os.getenv("GH_TOKEN")
-    gid = os.getenv("GH_GIST_ID")
-    if not tok or not gid:
+    players = _players_cache_read(max_age_hours)
+    METRICS.cache_result("players_cache", players is not None)
+    return players
+
+def _players_cache_read(max_age_hours: int) -> dict | None:
+    store = players_store()
+    if not store.readable():
         return None
     try:
-        r = requests.get(f"https://api.github.com/gists/{gid}", headers=_gist_headers(), timeout=20)
-        r.raise_for_status()
-        files = r.json().get("files", {})
-        meta_raw = files.get("players_meta.json", {}).get("content", "")
-        data_raw = files.get("players.json", {}).get("content", "")
-        if not meta_raw or not data_raw:
-            return None
-        meta = json.loads(meta_raw)
-        ts = meta.get("updated_ms", 0)
-        if (int(time.time()*1000) - ts) > max_age_hours*3600*1000:
-            return None
-        return json.loads(data_raw)
+        names = ["players_meta.json"] + [_players_shard(i) for i in range(PLAYERS_CACHE_MAX_SHARDS)]
+        return players_cache_decode(store.read_many(names), max_age_hours)
     except Exception as e:
         print(f"Players cache load skipped: {e}", file=sys.stderr)
         return None
 
 def players_cache_save(players: dict) -> None:
-    tok = os.getenv("GH_TOKEN")
-    gid = os.getenv("GH_GIST_ID")
-    if not tok:
+    store = players_store()
+    if not os.getenv("GH_TOKEN") and isinstance(store, GistStore):
+        return
+    if not store.writable():
+        # Creating a Gist per run would litter the account; ask for the secret instead.
+        print("Players cache save skipped: set GH_PLAYERS_GIST_ID to a Gist reserved for the players cache.", file=sys.stderr)
         return
-    payload = {
-        "files": {
-            "players.json": {"content": json.dumps(players)},
-            "players_meta.json": {"content": json.dumps({"updated_ms": int(time.time()*1000)})}
-        }
-    }
     try:
-        if gid:
-            r = requests.patch(f"https://api.github.com/gists/{gid}", headers=_gist_headers(), json=payload, timeout=30)
-            r.raise_for_status()
-        else:
-            create = {"description": "SFFL Beat Reporter state", "public": False, "files": payload["files"]}
-            r = requests.post("https://api.github.com/gists", headers=_gist_headers(), json=create, timeout=30)
-            r.raise_for_status()
-            new_id = r.json().get("id")
-            print(f"Created Gist state store for players: {new_id}")
-            os.environ["GH_GIST_ID"] = new_id
+        docs: Dict[str, str | None] = dict(players_cache_encode(players))
+        # Meta and shards go out in one write; shards a larger earlier copy left behind are removed.
+        docs.update({_players_shard(i): None for i in range(PLAYERS_CACHE_MAX_SHARDS) if _players_shard(i) not in docs})
+        store.write(docs)
     except Exception as e:
         print(f"Players cache save skipped: {e}", file=sys.stderr)
@@ -0,0 +1,372 @@
+"""End-to-end latency harness: the realtime daemon against local Sleeper, Gist and Bluesky stand-ins.
+
+    python sffl_e2e.py                                   # 500 transactions over 10 minutes
+    python sffl_e2e.py --burst 100 --over 60 --poll 2    # short run, 2s polling
+    python sffl_e2e.py --crash-at 30 --json e2e.json     # SIGKILL the daemon 30s in, then restart it
+
+Three in-process HTTP servers stand in for the Sleeper API (state, users, rosters, players
+and transactions, with ETag/304), the GitHub Gist API (the state and players Gists) and a
+Bluesky PDS (session, profile and createRecord). `sffl_bsky_realtime.py --daemon` runs
+unmodified in a subprocess, pointed at them through SFFL_SLEEPER_API, SFFL_GIST_API and
+SFFL_BSKY_PDS. Once it has polled once, the burst is armed: each synthetic transaction
+(sffl_bench's generators) becomes visible at its `created` time, and carries a marker
+player ("Marker 000042") so every post the PDS receives maps back to its transaction.
+
+Reported: created->posted latency (p50/p95/p99/max, from the first top-level post of each
+transaction, as the PDS received it), duplicates (transactions posted more than once) and
+drops (postable transactions never posted). The exit code is 1 on any duplicate or drop.
+Polling follows the daemon's own cadence; --cadence deadline (the default) marks today as
+the trade deadline so it polls fast throughout, like the bursts this simulates.
+"""
+import os, re, sys, json, time, random, signal, argparse, tempfile, threading, subprocess
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit, parse_qs
+from zoneinfo import ZoneInfo
+
+from sffl_bench import synth_players, synth_users_rosters, synth_transactions
+
+LEAGUE_ID = "e2e"
+WEEK = 9
+HANDLE = "sffl-e2e.test"
+DID = "did:plc:sffle2etest00000000000000"
+MARKER = "Marker {:06d}"
+MARKER_RE = re.compile(r"Marker (\d{6})")
+
+
+# -------- Stand-in servers --------
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real services
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        n = int(self.headers.get("content-length") or 0)
+        body = json.loads(self.rfile.read(n)) if n else None
+        status, doc, headers = self.server.app.handle(self.command, url.path, parse_qs(url.query), body, self.headers)
+        raw = b"" if doc is None else json.dumps(doc, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        for k, v in {"content-type": "application/json", **headers}.items():
+            self.send_header(k, v)
+        self.send_header("content-length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    do_GET = do_POST = do_PATCH = _dispatch
+
+    def log_message(self, *_args):
+        pass
+
+
+def serve(app) -> Tuple[ThreadingHTTPServer, str]:
+    """Start app on a free localhost port; returns (server, base URL)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.app = app
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class SleeperStandIn:
+    """Sleeper's /v1 endpoints for one league. Transactions stay hidden until arm(); after
+    that each one appears once its `created` time has passed."""
+    def __init__(self, users: List[dict], rosters: List[dict], players: Dict[str, dict], txns: List[dict]):
+        self.users, self.rosters = users, rosters
+        self.players = players
+        self.txns = sorted(txns, key=lambda t: t["created"])   # created holds offsets until armed
+        self.start_ms: int | None = None
+        self.polls = 0
+
+    def arm(self, start_ms: int) -> None:
+        for t in self.txns:
+            t["created"] += start_ms
+            t["status_updated"] = t["created"]
+        self.start_ms = start_ms
+
+    def handle(self, method, path, query, body, headers):
+        path = path.removeprefix("/v1")
+        if path == "/state/nfl":
+            return 200, {"week": WEEK, "leg": WEEK, "season": str(datetime.now().year), "season_type": "regular"}, {}
+        if path == f"/league/{LEAGUE_ID}/users":
+            return 200, self.users, {}
+        if path == f"/league/{LEAGUE_ID}/rosters":
+            return 200, self.rosters, {}
+        if path == "/players/nfl":
+            return 200, self.players, {}
+        m = re.fullmatch(rf"/league/{LEAGUE_ID}/transactions/(\d+)", path)
+        if m:
+            self.polls += 1
+            now = int(time.time() * 1000)
+            live = [t for t in self.txns if self.start_ms is not None and t["created"] <= now] if int(m.group(1)) == WEEK else []
+            etag = f'"{m.group(1)}-{len(live)}"'
+            if headers.get("If-None-Match") == etag:
+                return 304, None, {"etag": etag}
+            return 200, live[::-1], {"etag": etag}   # newest first, as Sleeper orders them
+        return 404, {"error": "not found"}, {}
+
+
+class GistStandIn:
+    """/gists: GET, PATCH (a null file deletes it) and POST, on in-memory Gists."""
+    def __init__(self):
+        self.gists: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, files: Dict[str, str] | None = None) -> str:
+        with self._lock:
+            gid = f"{len(self.gists) + 1:032x}"
+            self.gists[gid] = dict(files or {})
+        return gid
+
+    def _doc(self, gid: str) -> dict:
+        return {"id": gid, "files": {n: {"filename": n, "content": c, "truncated": False, "size": len(c)}
+                                     for n, c in self.gists[gid].items()}}
+
+    def handle(self, method, path, query, body, headers):
+        gid = path.removeprefix("/gists").strip("/")
+        if method == "POST" and not gid:
+            return 201, self._doc(self.create({n: f["content"] for n, f in body["files"].items()})), {}
+        if gid not in self.gists:
+            return 404, {"message": "Not Found"}, {}
+        if method == "PATCH":
+            with self._lock:
+                files = self.gists[gid]
+                for n, f in body.get("files", {}).items():
+                    if f is None:
+                        files.pop(n, None)
+                    else:
+                        files[n] = f["content"]
+        with self._lock:
+            return 200, self._doc(gid), {}
+
+
+def _jwt(scope: str, ttl: int = 86400) -> str:
+    import base64
+    def part(doc: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(doc).encode()).rstrip(b"=").decode("ascii")
+    now = int(time.time())
+    return f"{part({'alg': 'HS256', 'typ': 'JWT'})}.{part({'scope': scope, 'sub': DID, 'iat': now, 'exp': now + ttl})}.c2ln"
+
+
+class PdsStandIn:
+    """The slice of a Bluesky PDS the bot uses. Every createRecord is kept as
+    (received_ms, text, is_reply); latency_ms delays each response."""
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.records: List[Tuple[int, str, bool]] = []
+        self.logins = 0
+        self._lock = threading.Lock()
+
+    def _session(self) -> dict:
+        return {"did": DID, "handle": HANDLE, "accessJwt": _jwt("com.atproto.appPass"),
+                "refreshJwt": _jwt("com.atproto.refresh", 90 * 86400), "active": True}
+
+    def handle(self, method, path, query, body, headers):
+        if self.latency:
+            time.sleep(self.latency)
+        nsid = path.removeprefix("/xrpc/")
+        if nsid == "com.atproto.server.createSession":
+            self.logins += 1
+            return 200, self._session(), {}
+        if nsid == "com.atproto.server.refreshSession":
+            return 200, self._session(), {}
+        if nsid == "com.atproto.server.getSession":
+            return 200, {"did": DID, "handle": HANDLE, "active": True}, {}
+        if nsid == "app.bsky.actor.getProfile":
+            return 200, {"did": DID, "handle": HANDLE}, {}
+        if nsid == "com.atproto.repo.createRecord":
+            received = int(time.time() * 1000)
+            record = body.get("record") or {}
+            with self._lock:
+                n = len(self.records)
+                self.records.append((received, record.get("text", ""), bool(record.get("reply"))))
+            rkey = f"3e2e{n:09d}"
+            cid = "bafyreie2e" + f"{n:050d}"
+            return 200, {"uri": f"at://{DID}/app.bsky.feed.post/{rkey}", "cid": cid}, {}
+        return 501, {"error": "MethodNotImplemented", "message": nsid}, {}
+
+
+# -------- Burst --------
+def make_burst(n: int, over_secs: float, n_rosters: int, n_players: int, seed: int):
+    """Users, rosters, players and n transactions with created = offset (ms) into the burst.
+    Each transaction's first add is its marker player, so its post names it."""
+    users, rosters = synth_users_rosters(n_rosters)
+    players = synth_players(n_players)
+    txns = synth_transactions(n, n_rosters, list(players), 0, seed=seed)
+    rng = random.Random(seed)
+    offsets = sorted(rng.uniform(0, over_secs * 1000) for _ in txns)
+    for i, (t, offset) in enumerate(zip(txns, offsets)):
+        pid = f"E2E{i:06d}"
+        players[pid] = {"player_id": pid, "full_name": MARKER.format(i), "position": "WR", "fantasy_positions": ["WR"]}
+        t["adds"] = {pid: t["roster_ids"][0], **(t["adds"] or {})}
+        t["created"] = int(offset)
+    return users, rosters, players, txns
+
+
+def marker_of(txn: dict) -> int:
+    return int(next(iter(txn["adds"])).removeprefix("E2E"))
+
+
+def percentile(sorted_vals: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_vals:
+        return 0.0
+    k = max(0, min(len(sorted_vals) - 1, -(-len(sorted_vals) * pct // 100) - 1))
+    return sorted_vals[int(k)]
+
+
+def report(txns: List[dict], records: List[Tuple[int, str, bool]]) -> dict:
+    postable = {marker_of(t): t["created"] for t in txns if t["status"] == "complete"}
+    posted: Dict[int, List[int]] = {}
+    unexpected = 0
+    for received, text, is_reply in records:
+        m = MARKER_RE.search(text)
+        if is_reply and not m:
+            continue   # continuation of a long post
+        if not m or int(m.group(1)) not in postable:
+            unexpected += 1
+            continue
+        if not is_reply:
+            posted.setdefault(int(m.group(1)), []).append(received)
+    lat = sorted((min(ts) - postable[i]) / 1000 for i, ts in posted.items())
+    return {
+        "txns": len(txns), "postable": len(postable), "posted": len(posted), "records": len(records),
+        "dropped": len(postable) - len(posted),
+        "duplicates": sum(len(ts) - 1 for ts in posted.values()),
+        "unexpected": unexpected,
+        "latency_secs": {"p50": percentile(lat, 50), "p95": percentile(lat, 95), "p99": percentile(lat, 99),
+                         "max": lat[-1] if lat else 0.0},
+    }
+
+
+# -------- Daemon --------
+def daemon_env(workdir: str, sleeper: str, gist: str, pds: str, state_gist: str, players_gist: str,
+               poll: float | None, cadence: str) -> Dict[str, str]:
+    env = {k: v for k, v in os.environ.items()
+           if not k.startswith(("SFFL_", "GH_", "BSKY_")) and k not in ("SLEEPER_LEAGUE_ID", "DRY_RUN")}
+    for k in ("SFFL_BSKY_RATE_PER_SEC", "SFFL_BSKY_BURST", "SFFL_OUTBOX_WORKERS", "SFFL_PROFILE"):
+        if k in os.environ:   # tuning knobs under test pass through
+            env[k] = os.environ[k]
+    env.update({
+        "SFFL_SLEEPER_API": f"{sleeper}/v1", "SFFL_GIST_API": f"{gist}/gists", "SFFL_BSKY_PDS": pds,
+        "SFFL_CACHE_DIR": os.path.join(workdir, "cache"), "SFFL_PROFILE_DIR": os.path.join(workdir, "profile"),
+        "SFFL_METRICS_FILE": os.path.join(workdir, "metrics.jsonl"), "SFFL_STATE_BACKEND": "gist",
+        "GH_TOKEN": "e2e", "GH_GIST_ID": state_gist, "GH_PLAYERS_GIST_ID": players_gist,
+        "SLEEPER_LEAGUE_ID": LEAGUE_ID, "BSKY_HANDLE": HANDLE, "BSKY_APP_PASSWORD": "e2e",
+        "PYTHONUNBUFFERED": "1",
+    })
+    if poll:
+        env.update({k: str(max(1, round(poll))) for k in ("SFFL_POLL_FAST_SECS", "SFFL_POLL_NORMAL_SECS", "SFFL_POLL_SLOW_SECS")})
+    if cadence == "deadline":
+        env["SFFL_TRADE_DEADLINE"] = datetime.now(ZoneInfo("America/New_York")).date().isoformat()
+    return env
+
+
+def start_daemon(env: Dict[str, str], log) -> subprocess.Popen:
+    here = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.Popen([sys.executable, os.path.join(here, "sffl_bsky_realtime.py"), "--daemon"],
+                            cwd=here, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def reset_workdir(workdir: str) -> None:
+    """Clear what a previous run left: its outbox and signatures would mark this run's
+    (identically seeded) transactions as already posted, against fresh stand-ins."""
+    import shutil
+    shutil.rmtree(os.path.join(workdir, "cache"), ignore_errors=True)
+    shutil.rmtree(os.path.join(workdir, "profile"), ignore_errors=True)
+    for name in ("daemon.log", "metrics.jsonl"):
+        if os.path.exists(os.path.join(workdir, name)):
+            os.remove(os.path.join(workdir, name))
+
+
+def run(args, workdir: str) -> dict:
+    users, rosters, players, txns = make_burst(args.burst, args.over, args.rosters, args.players, args.seed)
+    sleeper, gists, pds = SleeperStandIn(users, rosters, players, txns), GistStandIn(), PdsStandIn(args.pds_latency_ms)
+    servers = [serve(app) for app in (sleeper, gists, pds)]
+    (_, sleeper_url), (_, gist_url), (_, pds_url) = servers
+    env = daemon_env(workdir, sleeper_url, gist_url, pds_url, gists.create(), gists.create(), args.poll, args.cadence)
+    log_path = os.path.join(workdir, "daemon.log")
+    n_postable = sum(t["status"] == "complete" for t in txns)
+
+    def posted() -> int:
+        return len({m.group(1) for _, text, reply in list(pds.records) if not reply for m in [MARKER_RE.search(text)] if m})
+
+    with open(log_path, "ab") as log:
+        proc = start_daemon(env, log)
+        try:
+            deadline = time.time() + args.startup
+            while not sleeper.polls:
+                if proc.poll() is not None or time.time() > deadline:
+                    raise RuntimeError(f"daemon never polled Sleeper; see {log_path}")
+                time.sleep(0.1)
+            start_ms = int(time.time() * 1000)
+            sleeper.arm(start_ms)
+            print(f"Burst armed: {len(txns)} transaction(s) ({n_postable} postable) over {args.over:g}s.")
+            crashed = args.crash_at is None
+            end = start_ms / 1000 + args.over + args.drain
+            while time.time() < end and not (time.time() > start_ms / 1000 + args.over and posted() >= n_postable):
+                if not crashed and time.time() >= start_ms / 1000 + args.crash_at:
+                    proc.kill()
+                    proc.wait()
+                    print(f"Daemon killed at +{args.crash_at:g}s with {posted()} posted; restarting.")
+                    proc, crashed = start_daemon(env, log), True
+                if proc.poll() is not None:
+                    raise RuntimeError(f"daemon exited with {proc.returncode}; see {log_path}")
+                time.sleep(0.2)
+            time.sleep(args.settle)   # late duplicates would land here
+        finally:
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGTERM)
+                try:
+                    proc.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+            for server, _ in servers:
+                server.shutdown()
+
+    result = report(txns, pds.records)
+    result.update({"burst_secs": args.over, "logins": pds.logins, "transaction_polls": sleeper.polls, "workdir": workdir})
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SFFL end-to-end latency harness (local stand-ins)")
+    ap.add_argument("--burst", type=int, default=500, help="transactions in the burst")
+    ap.add_argument("--over", type=float, default=600, help="seconds the burst is spread over")
+    ap.add_argument("--rosters", type=int, default=12)
+    ap.add_argument("--players", type=int, default=2000, help="size of the synthetic player dump")
+    ap.add_argument("--seed", type=int, default=3)
+    ap.add_argument("--poll", type=float, help="fixed daemon poll interval in seconds (default: the daemon's cadence)")
+    ap.add_argument("--cadence", choices=("deadline", "live"), default="deadline",
+                    help="deadline: today is the trade deadline (fast polling); live: the clock decides")
+    ap.add_argument("--pds-latency-ms", type=float, default=0.0, help="added to every PDS response")
+    ap.add_argument("--crash-at", type=float, help="SIGKILL the daemon this many seconds into the burst, then restart it")
+    ap.add_argument("--drain", type=float, default=300, help="max seconds after the burst to wait for posts")
+    ap.add_argument("--settle", type=float, default=10, help="seconds to keep running once everything is posted")
+    ap.add_argument("--startup", type=float, default=60, help="max seconds to wait for the daemon's first poll")
+    ap.add_argument("--workdir", help="keep the daemon's cache, log and metrics here, cleared first (default: a temp dir)")
+    ap.add_argument("--json", help="also write the report to this file")
+    args = ap.parse_args()
+
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        reset_workdir(args.workdir)
+        result = run(args, args.workdir)
+    else:
+        with tempfile.TemporaryDirectory(prefix="sffl-e2e-") as workdir:
+            result = run(args, workdir)
+            result["workdir"] = None
+
+    lat = result["latency_secs"]
+    print(f"Posted {result['posted']}/{result['postable']} postable transaction(s) "
+          f"({result['records']} record(s), {result['logins']} login(s), {result['transaction_polls']} poll(s)).")
+    print(f"created->posted latency: p50 {lat['p50']:.2f}s  p95 {lat['p95']:.2f}s  p99 {lat['p99']:.2f}s  max {lat['max']:.2f}s")
+    print(f"Duplicates: {result['duplicates']}  Dropped: {result['dropped']}  Unexpected: {result['unexpected']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    if result["duplicates"] or result["dropped"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
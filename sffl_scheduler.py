@@ -0,0 +1,245 @@
+"""Every SFFL job in one process, on America/New_York schedules.
+
+    python sffl_scheduler.py             # run forever: realtime polling plus the timed jobs
+    python sffl_scheduler.py --once      # run whatever is due, including missed runs, then exit
+    python sffl_scheduler.py --jobs realtime,daily
+
+Timed jobs fire at a New York wall-clock hour (and weekday), computed per date, so DST needs
+no second cron and no is_now_ny guard. The last slot each job handled is kept in
+scheduler.json under the cache dir; a slot missed while the process was down (or while a
+cron runner was delayed) still runs if it is at most grace_hours old, otherwise it is
+skipped; with no state file yet, jobs start from their next slot. A slot is recorded
+before its job runs, so a crash never posts it twice; it is released again when the job
+could not start anywhere (week lookup or snapshot fetch failed), so the next pass retries.
+Jobs due together share one league snapshot (one week lookup, one users/rosters/players
+fetch), and every pass shares the HTTP pool, metadata cache, player index, transaction
+store and Bluesky login.
+"""
+import os, sys, json, time, signal, argparse, threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+from zoneinfo import ZoneInfo
+from sffl_common import (
+    fetch_league_snapshot, get_current_week, leagues_or_exit, run_leagues, LeagueConfig, LeagueSnapshot,
+    METRICS, CACHE_DIR, DEBUG, profile_run, _write_atomic
+)
+import sffl_bsky_daily as daily
+import sffl_bsky_weekly_rumors as rumors
+import sffl_bsky_realtime as realtime
+import main as main_job
+
+TZ = ZoneInfo("America/New_York")
+SCHEDULER_STATE = os.path.join(CACHE_DIR, "scheduler.json")
+SCHEDULER_JOBS = os.getenv("SFFL_SCHEDULER_JOBS", "realtime,daily,weekly_rumors,main")
+SCHEDULER_MAX_SLEEP_SECS = 3600   # re-check the clock at least hourly
+
+
+@dataclass
+class Job:
+    name: str
+    hour: int                  # New York wall-clock hour
+    dow: int | None            # Mon=0..Sun=6; None = every day
+    grace_hours: float         # a slot missed by more than this is skipped, not caught up
+    weeks_back: int            # transaction history its snapshot must carry
+    run: Callable[[LeagueConfig, LeagueSnapshot], str]
+
+    def _slot(self, day) -> datetime | None:
+        if self.dow is not None and day.weekday() != self.dow:
+            return None
+        return datetime(day.year, day.month, day.day, self.hour, tzinfo=TZ)
+
+    def last_slot(self, now: datetime) -> datetime:
+        """Most recent scheduled time at or before now."""
+        for back in range(8):
+            slot = self._slot(now.date() - timedelta(days=back))
+            if slot is not None and slot <= now:
+                return slot
+        raise ValueError(f"{self.name}: no slot in the last week")
+
+    def next_slot(self, now: datetime) -> datetime:
+        for ahead in range(8):
+            slot = self._slot(now.date() + timedelta(days=ahead))
+            if slot is not None and slot > now:
+                return slot
+        raise ValueError(f"{self.name}: no slot in the next week")
+
+
+TIMED_JOBS = {job.name: job for job in (
+    Job("daily", 8, None, 12, daily.WEEKS_BACK, daily.run_league),
+    Job("weekly_rumors", 20, 2, 24, rumors.SEASON_WEEKS, rumors.run_league),
+    Job("main", 8, None, 12, 0, lambda lg, snap: main_job.run_league(lg, None, snap)),
+)}
+
+
+def slots_load(path: str = SCHEDULER_STATE) -> Dict[str, float]:
+    """job name -> epoch seconds of the last slot it handled."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def slots_save(slots: Dict[str, float], path: str = SCHEDULER_STATE) -> None:
+    _write_atomic(path, json.dumps(slots, sort_keys=True))
+
+
+def due_jobs(jobs: List[Job], slots: Dict[str, float], now: datetime) -> List[Job]:
+    """Jobs whose latest slot has not been handled; claims them in `slots`. A slot older
+    than the job's grace is claimed without running (logged as skipped), and a job with no
+    recorded slot yet starts from its next slot rather than catching up on a first start."""
+    due = []
+    for job in jobs:
+        slot = job.last_slot(now)
+        first = job.name not in slots
+        if slot.timestamp() <= slots.get(job.name, 0):
+            continue
+        slots[job.name] = slot.timestamp()
+        if first:
+            continue
+        late = now - slot
+        if late > timedelta(hours=job.grace_hours):
+            print(f"Skipping {job.name} for {slot:%Y-%m-%d %H:%M %Z}: missed by {late.total_seconds() / 3600:.1f}h (grace {job.grace_hours:g}h).")
+            continue
+        if late > timedelta(minutes=5):
+            print(f"Catching up {job.name} for {slot:%Y-%m-%d %H:%M %Z} ({late.total_seconds() / 3600:.1f}h late).")
+        due.append(job)
+    return due
+
+
+class NotStarted(Exception):
+    """A timed job failed before it could post anything (its snapshot fetch failed)."""
+
+
+def release(jobs: List[Job], slots: Dict[str, float], claimed_from: Dict[str, float]) -> None:
+    """Undo due_jobs' claims for jobs that never started, so the next pass retries them."""
+    for job in jobs:
+        if job.name in claimed_from:
+            slots[job.name] = claimed_from[job.name]
+        else:
+            slots.pop(job.name, None)
+    slots_save(slots)
+
+
+def run_pass(leagues: List[LeagueConfig], jobs: List[Job], with_realtime: bool,
+             caches: Dict[str, dict], slots: Dict[str, float]) -> int:
+    """Run one realtime tick (if enabled) and every due timed job for each league, the
+    leagues concurrently. Returns the number of realtime posts."""
+    now = datetime.now(TZ)
+    claimed_from = dict(slots)
+    due = due_jobs(jobs, slots, now)
+    if due:
+        slots_save(slots)
+    if not due and not with_realtime:
+        return 0
+    try:
+        week = get_current_week()   # once per pass, for every job and league
+    except Exception:
+        if due:
+            release(due, slots, claimed_from)
+        raise
+
+    def league_pass(lg: LeagueConfig) -> List[tuple]:
+        out = []
+        if with_realtime:
+            try:
+                posted, msg = realtime.step(lg, caches.setdefault(lg.league_id, {}), week)
+                out.append(("realtime", posted, msg))
+            except Exception as e:
+                out.append(("realtime", 0, e))
+        if due:
+            try:   # fetched once, deep enough for every due job
+                snap = fetch_league_snapshot(lg.league_id, week, weeks_back=max(j.weeks_back for j in due))
+            except Exception as e:
+                return out + [(job.name, 0, NotStarted(e)) for job in due]
+            for job in due:
+                try:
+                    out.append((job.name, 0, job.run(lg, snap)))
+                except Exception as e:
+                    out.append((job.name, 0, e))
+        return out
+
+    posted = 0
+    results = run_leagues(leagues, league_pass)
+    not_started: Dict[str, int] = {}
+    for lg in leagues:
+        res = results[lg.league_id]
+        for name, n, msg in ([] if isinstance(res, Exception) else res):
+            posted += n
+            if isinstance(msg, NotStarted):
+                not_started[name] = not_started.get(name, 0) + 1
+            tag = f"[{lg.league_id}] " if len(leagues) > 1 else ""
+            if isinstance(msg, Exception):
+                print(f"{datetime.now(TZ):%Y-%m-%d %H:%M:%S} {tag}{name} failed: {msg}", file=sys.stderr)
+            elif name != "realtime" or n or DEBUG:
+                print(f"{datetime.now(TZ):%Y-%m-%d %H:%M:%S} {tag}{name}: {msg}")
+    retry = [job for job in due if not_started.get(job.name) == len(leagues)]
+    if retry:
+        release(retry, slots, claimed_from)
+        print(f"Will retry {', '.join(job.name for job in retry)} next pass: no league could start.")
+    for job in due:
+        if job not in retry and not_started.get(job.name):
+            # Other leagues already posted this slot; rerunning would post theirs twice.
+            print(f"{job.name}: {not_started[job.name]} league(s) could not start and are not retried.", file=sys.stderr)
+    return posted
+
+
+def sleep_secs(jobs: List[Job], with_realtime: bool, last_activity: float) -> float:
+    """Until the next timed slot or realtime poll, whichever comes first."""
+    now = datetime.now(TZ)
+    secs = float(SCHEDULER_MAX_SLEEP_SECS)
+    if jobs:
+        secs = min(secs, min((job.next_slot(now) - now).total_seconds() for job in jobs))
+    if with_realtime:
+        secs = min(secs, realtime.poll_interval(now, last_activity))
+    return max(1.0, secs)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SFFL job scheduler (New York time)")
+    ap.add_argument("--once", action="store_true", help="run what is due (and missed runs) once, then exit")
+    ap.add_argument("--jobs", default=SCHEDULER_JOBS, help=f"comma-separated subset of realtime,{','.join(TIMED_JOBS)}")
+    args = ap.parse_args()
+
+    names = [n.strip() for n in args.jobs.split(",") if n.strip()]
+    unknown = [n for n in names if n != "realtime" and n not in TIMED_JOBS]
+    if unknown:
+        print(f"Unknown job(s): {', '.join(unknown)}", file=sys.stderr)
+        sys.exit(2)
+    jobs = [TIMED_JOBS[n] for n in names if n in TIMED_JOBS]
+    with_realtime = "realtime" in names
+    leagues = leagues_or_exit()
+    caches: Dict[str, dict] = {}
+    slots = slots_load()
+
+    if args.once:
+        try:
+            run_pass(leagues, jobs, with_realtime, caches, slots)
+        finally:
+            METRICS.emit("scheduler")
+        return
+
+    stop = threading.Event()
+    def _stop(signum, _frame):
+        print(f"Received signal {signum}; shutting down after this pass.")
+        stop.set()
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    print(f"Scheduler started for {len(leagues)} league(s): {', '.join(names)}.")
+    last_activity = 0.0
+    while not stop.is_set():
+        try:
+            if run_pass(leagues, jobs, with_realtime, caches, slots):
+                last_activity = time.time()
+        except Exception as e:
+            print(f"Scheduler pass failed: {e}", file=sys.stderr)
+        METRICS.emit("scheduler")   # one record per pass
+        METRICS.reset()
+        stop.wait(sleep_secs(jobs, with_realtime, last_activity))
+    print("Scheduler stopped.")
+
+
+if __name__ == "__main__":
+    with profile_run("scheduler"):
+        main()